@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Import an orders CSV export (orders.csv by default) into restaurant_orders.
+
+All rows are loaded in one transaction with COPY (see src.saver.import_orders).
+Separator lines and rows without a date or restaurant are skipped; customer
+messages without a restaurant id are imported with a NULL id, as
+save_message() stores them.
+
+Usage: python import_orders.py [path/to/orders.csv]
+"""
+import csv
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.saver import import_orders
+
+
+def _value(row: dict, column: str) -> str | None:
+    value = (row.get(column) or "").strip()
+    return value or None
+
+
+def read_orders(filepath: str) -> tuple[list[dict], int]:
+    """Return (restaurant_orders rows, number of skipped lines) for a CSV export."""
+    rows, skipped = [], 0
+    with open(filepath, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        # The export's headers carry typos and stray spaces ("restaurent_id", "corrections ")
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        for row in reader:
+            restaurant_id, order_date = _value(row, "restaurent_id"), _value(row, "date")
+            restaurant_name = _value(row, "restaurent_name")
+            if not order_date or not (restaurant_name or (restaurant_id or "").isdigit()):
+                skipped += 1
+                continue
+            quantity, corrections = _value(row, "quantity"), _value(row, "corrections")
+            rows.append({
+                "restaurant_id": int(restaurant_id) if restaurant_id and restaurant_id.isdigit() else None,
+                "restaurant_name": restaurant_name,
+                "quantity": float(quantity) if quantity else None,
+                "unit": _value(row, "unit"),
+                "product": _value(row, "product"),
+                "corrections": corrections,
+                "date": datetime.strptime(order_date, "%d/%m/%Y"),
+                "original_text": _value(row, "original text"),
+                # "NEEDS ATTENTION - ..." in either column of the export, empty otherwise
+                "need_attention": bool(_value(row, "need_attention"))
+                or (corrections or "").startswith("NEEDS ATTENTION"),
+                "message": _value(row, "message")
+            })
+    return rows, skipped
+
+
+if __name__ == "__main__":
+    filepath = sys.argv[1] if len(sys.argv) > 1 else "orders.csv"
+    rows, skipped = read_orders(filepath)
+    print(f"📄 Read {len(rows)} order rows from {filepath} ({skipped} skipped)")
+    try:
+        print(f"✅ Imported {import_orders(rows)} rows into restaurant_orders")
+    except Exception as e:
+        print(f"❌ Import failed, nothing was written: {e}")
+        sys.exit(1)
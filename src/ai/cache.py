@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from src.ai.client import ai_semaphore
+from src.catalog import catalog
+from src.logger import PROJECT_ROOT, get_logger
+
+logger = get_logger(__name__)
+
+# Cache location and bounds, overridable per deployment
+CACHE_PATH = os.getenv("AI_CACHE_PATH", str(PROJECT_ROOT / ".cache" / "ai_cache.sqlite3"))
+CACHE_TTL = float(os.getenv("AI_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("AI_CACHE_MAX_ENTRIES", 20000))
+CACHE_ENABLED = os.getenv("AI_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+# Request parameters that change the answer (timeouts etc. do not)
+_KEY_PARAMS = ("response_format", "max_tokens", "temperature", "top_p", "seed")
+
+
+class CompletionCache:
+    """
+    Content-addressed cache of OpenAI chat completions in a local SQLite file.
+
+    Keys are a SHA-256 of (model, messages, answer-affecting params, catalog
+    version). The file runs in WAL mode, so every uvicorn worker on the host
+    shares it and entries survive restarts. Entries expire after `ttl`
+    seconds and the least recently used ones are evicted above `max_entries`.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed_at ON completions (accessed_at)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, messages: list, params: dict) -> str:
+        payload = json.dumps({
+            "model": model,
+            "messages": messages,
+            "params": {k: params[k] for k in _KEY_PARAMS if k in params},
+            "catalog_version": catalog.version
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT content, created_at FROM completions WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row and now - row[1] < self.ttl:
+            conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            with self._lock:
+                self.hits += 1
+            return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, model: str, content: str):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO completions (key, model, content, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, model, content, now, now)
+        )
+        conn.commit()
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % 100 == 1
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries and the least recently used ones above the size bound."""
+        conn = self._conn()
+        conn.execute("DELETE FROM completions WHERE created_at < ?", (time.time() - self.ttl,))
+        conn.execute("""
+            DELETE FROM completions WHERE key IN (
+                SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        try:
+            size = self._conn().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        except (sqlite3.Error, OSError):
+            size = None
+        return {
+            "enabled": CACHE_ENABLED,
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+
+completion_cache = CompletionCache()
+
+
+def _cache_lookup(model: str, messages: list, params: dict) -> tuple[str | None, str | None]:
+    """Return (cache key, cached content). The key is None when caching is off or broken."""
+    if not CACHE_ENABLED:
+        return None, None
+    try:
+        key = completion_cache.make_key(model, messages, params)
+        return key, completion_cache.get(key)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("⚠️  AI cache unavailable: %s", e)
+        return None, None
+
+
+def _cache_store(key: str | None, model: str, content: str | None, params: dict):
+    if not key or content is None:
+        return
+    if params.get("response_format", {}).get("type") == "json_object":
+        try:
+            json.loads(content)
+        except ValueError:
+            return
+    try:
+        completion_cache.set(key, model, content)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("⚠️  Could not write AI cache entry: %s", e)
+
+
+def cached_completion(openai_client, model: str, messages: list, **params) -> str:
+    """
+    Run a chat completion through the persistent cache and return the message content.
+
+    Failed calls raise as usual and are never cached. JSON-mode replies are
+    only cached when they parse, so a malformed answer is not replayed.
+    """
+    key, content = _cache_lookup(model, messages, params)
+    if content is not None:
+        return content
+
+    response = openai_client.chat.completions.create(model=model, messages=messages, **params)
+    content = response.choices[0].message.content
+    _cache_store(key, model, content, params)
+    return content
+
+
+async def cached_completion_async(openai_client, model: str, messages: list, **params) -> str:
+    """
+    Awaitable cached_completion() for an AsyncOpenAI client. Cache misses
+    wait for a slot of ai_semaphore(), so no more than AI_CONCURRENCY calls
+    run at once on this event loop. The SQLite cache is read and written
+    from a worker thread, since a busy file can block for its lock timeout.
+    """
+    key, content = await asyncio.to_thread(_cache_lookup, model, messages, params)
+    if content is not None:
+        return content
+
+    async with ai_semaphore():
+        response = await openai_client.chat.completions.create(model=model, messages=messages, **params)
+    content = response.choices[0].message.content
+    await asyncio.to_thread(_cache_store, key, model, content, params)
+    return content
+
+
+def get_ai_cache_stats() -> dict:
+    return completion_cache.stats()
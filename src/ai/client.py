@@ -1,11 +1,115 @@
+import asyncio
+import importlib.util
 import os
-from openai import OpenAI
-
-# Initialize client only if API key is available
-# This allows the app to start even if OpenAI isn't configured
-_api_key = os.getenv("OPENAI_API_KEY")
-if _api_key:
-    client = OpenAI(api_key=_api_key)
-else:
-    client = None
-    print("⚠️  Warning: OPENAI_API_KEY not set. AI features will be disabled.")
+import threading
+import weakref
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# How many AI calls one worker runs at the same time (per-line matches etc.)
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", 8))
+
+# Default per-call timeouts (seconds); call sites may pass a tighter `timeout`
+AI_TIMEOUT = float(os.getenv("AI_TIMEOUT", 30))
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", 5))
+# Retries on connection errors, 429s and 5xx; the SDK backs off exponentially with jitter
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 2))
+# How long an idle connection is kept open for the next call
+AI_KEEPALIVE_EXPIRY = float(os.getenv("AI_KEEPALIVE_EXPIRY", 120))
+
+# HTTP/2 multiplexes concurrent calls over one connection; it needs the optional `h2` package
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+def _http_options() -> dict:
+    return {
+        "http2": HTTP2,
+        "timeout": httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=AI_CONCURRENCY * 2,
+            max_keepalive_connections=AI_CONCURRENCY,
+            keepalive_expiry=AI_KEEPALIVE_EXPIRY
+        )
+    }
+
+
+def create_client(api_key: str = None) -> OpenAI | None:
+    """
+    Build an OpenAI client on a tuned, keep-alive connection pool.
+    Returns None when no API key is configured.
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    return OpenAI(
+        api_key=api_key,
+        max_retries=AI_MAX_RETRIES,
+        timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+        http_client=httpx.Client(**_http_options())
+    )
+
+
+def create_async_client(api_key: str = None) -> AsyncOpenAI | None:
+    """Async counterpart of create_client()."""
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+    return AsyncOpenAI(
+        api_key=api_key,
+        max_retries=AI_MAX_RETRIES,
+        timeout=httpx.Timeout(AI_TIMEOUT, connect=AI_CONNECT_TIMEOUT),
+        http_client=httpx.AsyncClient(**_http_options())
+    )
+
+
+# One sync client per worker process, shared by every src.ai module, so TLS
+# handshakes and pooled connections are reused across call sites. It is None
+# when OPENAI_API_KEY is missing, so the app can still start.
+client = create_client()
+if not client:
+    logger.warning("⚠️  Warning: OPENAI_API_KEY not set. AI features will be disabled.")
+
+# httpx.AsyncClient connections and asyncio.Semaphore waiters belong to the
+# event loop that created them, so the async client and the concurrency limit
+# are kept per loop (the webhook loop, ingest workers, test loops, ...)
+_async_clients = weakref.WeakKeyDictionary()
+_semaphores = weakref.WeakKeyDictionary()
+_per_loop_lock = threading.Lock()
+
+
+def get_async_client() -> AsyncOpenAI | None:
+    """The AsyncOpenAI client for the running event loop, or None without an API key."""
+    if not client:
+        return None
+    loop = asyncio.get_running_loop()
+    with _per_loop_lock:
+        async_client = _async_clients.get(loop)
+        if async_client is None:
+            async_client = _async_clients[loop] = create_async_client()
+    return async_client
+
+
+async def close_async_client():
+    """
+    Close the running event loop's AsyncOpenAI client, if it has one, so its
+    pooled connections are released before the loop shuts down. Call it from
+    the loop's shutdown path; a later get_async_client() builds a new client.
+    """
+    loop = asyncio.get_running_loop()
+    with _per_loop_lock:
+        async_client = _async_clients.pop(loop, None)
+    if async_client is not None:
+        await async_client.close()
+
+
+def ai_semaphore() -> asyncio.Semaphore:
+    """Caps AI calls in flight on the running event loop at AI_CONCURRENCY."""
+    loop = asyncio.get_running_loop()
+    with _per_loop_lock:
+        semaphore = _semaphores.get(loop)
+        if semaphore is None:
+            semaphore = _semaphores[loop] = asyncio.Semaphore(AI_CONCURRENCY)
+    return semaphore
@@ -1,34 +1,140 @@
-from src.ai.client import client
+from src.ai.client import client, get_async_client
+from src.ai.cache import cached_completion, cached_completion_async
+from src.parser import extract_product
+from src.budget import LatencyBudget
 import json
+import re
+import threading
+from src.logger import get_logger
 
+logger = get_logger(__name__)
 
-def conversational_agent(message: str, restaurant_name: str):
+# Quantity followed by a unit, e.g. "3bg", "2 kg", "5 boxes"
+_QUANTITY_UNIT = re.compile(
+    r"\d+(?:\.\d+)?\s*(?:bg|kg|bx|box|pc|p|k|kilo|kilogram|bag|piece|tray|bunch|bucket)(?:e?s)?\b",
+    re.IGNORECASE
+)
+# A quantity or unit token on its own: "3", "2.5", "3bg", "kg", "bags".
+# The one-letter units only count after a number ("3p"), never alone.
+_QUANTITY_OR_UNIT_WORD = re.compile(
+    r"\d+(?:\.\d+)?(?:(?:bg|kg|bx|box|pc|p|k|kilo|kilogram|bag|piece|tray|bunch|bucket)(?:e?s)?)?"
+    r"|(?:bg|kg|bx|box|pc|kilo|kilogram|bag|piece|tray|bunch|bucket)(?:e?s)?",
+)
+# Words that may sit in an order line besides quantity, unit and product
+_ORDER_FILLER_WORDS = {"of", "x", "and", "please", "pls", "plz"}
+_QUESTION_WORDS = {"what", "when", "where", "why", "how", "who", "which", "can", "could",
+                   "do", "does", "did", "is", "are", "will", "would", "should", "have", "has"}
+_CONVERSATION_WORDS = {"hi", "hello", "hey", "thanks", "thank", "thx", "cheers", "morning",
+                       "afternoon", "evening", "sorry", "cancel", "bye", "invoice", "delivery"}
+# Complaints quote quantities and products too ("the 3 bags of onion were rotten")
+_COMPLAINT_WORDS = {"rotten", "missing", "wrong", "late", "not", "no", "damaged", "broken", "bad",
+                    "short", "refund", "return", "returned", "complaint", "complain", "never",
+                    "instead", "yesterday", "were", "was", "didn't", "wasn't", "weren't"}
+
+# fast_*: decided locally; llm: the model was called; no_client / budget_skipped:
+# ambiguous, but treated as an order without the model
+_classifier_stats = {"fast_order": 0, "fast_message": 0, "llm": 0, "no_client": 0, "budget_skipped": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome: str):
+    with _stats_lock:
+        _classifier_stats[outcome] += 1
+
+
+def _leftover_words(line: str, products: list[str]) -> list[str]:
+    """Words of an order line that are not a quantity, unit, product or filler."""
+    text = re.sub(r"[^a-z0-9.\s]", " ", line.lower())
+    for product in products:
+        text = re.sub(r"\b" + re.escape(product.lower()) + r"\b", " ", text)
+    words = (word.strip(".") for word in text.split())
+    return [
+        word for word in words
+        if word and word not in _ORDER_FILLER_WORDS and not _QUANTITY_OR_UNIT_WORD.fullmatch(word)
+    ]
+
+
+def classify_message_locally(message: str) -> str | None:
     """
-    Main conversational agent function for handling natural language interactions.
-    Determines if message is an order or a natural conversation message.
-    
-    Args:
-        message: User's input message
-        restaurant_name: Name of the restaurant sending the message
-    
-    Returns:
-        dict: {
-            "type": "order" or "message",
-            "response": reply to send back,
-            "original_message": the original message,
-            "restaurant_name": restaurant name
-        }
+    Deterministic pre-classifier run before the LLM.
+
+    Returns "order" when every line is only a quantity, an optional unit and
+    catalog products, and nothing reads like a question, conversation or a
+    complaint. Returns "message" when there is no quantity or product at
+    all but clear question/greeting/complaint cues. Returns None when the
+    message is ambiguous and needs the model.
     """
-    if not client:
+    lines = [line.strip() for line in (message or "").splitlines() if line.strip()]
+    if not lines:
+        return None
+
+    has_cues = False
+    order_lines = 0
+    any_order_signal = False
+    for line in lines:
+        words = re.findall(r"[a-z']+", line.lower())
+        # Question and greeting cues are checked per line, not just on the first one
+        if "?" in line or (words and words[0] in _QUESTION_WORDS) or any(
+            word in _CONVERSATION_WORDS or word in _COMPLAINT_WORDS for word in words
+        ):
+            has_cues = True
+
+        has_number = bool(re.search(r"\d", line))
+        products = extract_product(line)
+        if has_number or products:
+            any_order_signal = True
+        if has_number and (products or _QUANTITY_UNIT.search(line)) and not _leftover_words(line, products):
+            order_lines += 1
+
+    if order_lines == len(lines) and not has_cues:
+        return "order"
+    if not any_order_signal and has_cues:
+        return "message"
+    return None
+
+
+def get_classifier_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_classifier_stats)
+    total = sum(stats.values())
+    stats["fast_path_rate"] = round((stats["fast_order"] + stats["fast_message"]) / total, 3) if total else 0.0
+    return stats
+
+
+_MESSAGE_REPLY = "Your message has been noted, and we will get back to you."
+
+
+def _agent_result(message_type: str, message: str, restaurant_name: str) -> dict:
+    return {
+        "type": message_type,
+        # Orders get their reply after processing
+        "response": _MESSAGE_REPLY if message_type == "message" else None,
+        "original_message": message,
+        "restaurant_name": restaurant_name
+    }
+
+
+def _classify_without_model(message: str, restaurant_name: str, openai_client) -> dict | None:
+    """Fast path and no-OpenAI fallback shared by the sync and async agents."""
+    # Clear-cut orders and chit-chat are decided locally, without the model
+    local_type = classify_message_locally(message)
+    if local_type:
+        _count(f"fast_{local_type}")
+        return _agent_result(local_type, message, restaurant_name)
+
+    if not openai_client:
+        _count("no_client")
         # If OpenAI is not available, assume everything is an order
         return {
             "type": "order",
-            "response": "Your message has been noted, and we will get back to you.",
+            "response": _MESSAGE_REPLY,
             "original_message": message,
             "restaurant_name": restaurant_name
         }
-    
-    # Use OpenAI to classify the message
+    return None
+
+
+def _classification_request(message: str) -> dict:
     prompt = f"""
 You are a message classifier for an order management system.
 
@@ -50,43 +156,79 @@ Examples:
 - "Can I cancel my order?" -> {{"type": "message", "confidence": "high"}}
 - "Thank you!" -> {{"type": "message", "confidence": "high"}}
 """
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": prompt}],
+        "response_format": {"type": "json_object"},
+        "temperature": 0  # deterministic, so identical messages can be served from cache
+    }
+
+
+def _message_type(content: str) -> str:
+    classification = json.loads(content)
+    return "message" if classification.get("type", "order") == "message" else "order"
 
+
+def conversational_agent(message: str, restaurant_name: str):
+    """
+    Main conversational agent function for handling natural language interactions.
+    Determines if message is an order or a natural conversation message.
+    
+    Args:
+        message: User's input message
+        restaurant_name: Name of the restaurant sending the message
+    
+    Returns:
+        dict: {
+            "type": "order" or "message",
+            "response": reply to send back,
+            "original_message": the original message,
+            "restaurant_name": restaurant name
+        }
+    """
+    result = _classify_without_model(message, restaurant_name, client)
+    if result:
+        return result
+
+    # Use OpenAI to classify the message
+    _count("llm")
+    try:
+        content = cached_completion(client, **_classification_request(message))
+        return _agent_result(_message_type(content), message, restaurant_name)
+    except Exception as e:
+        logger.error("Error in conversational agent: %s", e)
+        # Default to treating as order if classification fails
+        return _agent_result("order", message, restaurant_name)
+
+
+async def conversational_agent_async(message: str, restaurant_name: str, budget: LatencyBudget = None):
+    """
+    Awaitable conversational_agent() using the event loop's AsyncOpenAI client.
+    With too little of the latency budget left, ambiguous messages are
+    treated as orders instead of waiting for the model.
+    """
+    result = _classify_without_model(message, restaurant_name, get_async_client())
+    if result:
+        return result
+
+    request = _classification_request(message)
+    if budget and not budget.allows_ai():
+        logger.info("⏱️  Latency budget low, skipping AI classification")
+        budget.skip("classification", [message])
+        _count("budget_skipped")
+        return _agent_result("order", message, restaurant_name)
+
+    _count("llm")
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        
-        classification = json.loads(response.choices[0].message.content)
-        message_type = classification.get("type", "order")
-        
-        if message_type == "message":
-            # It's a natural conversation message
-            return {
-                "type": "message",
-                "response": "Your message has been noted, and we will get back to you.",
-                "original_message": message,
-                "restaurant_name": restaurant_name
-            }
+        if budget:
+            content = await budget.call(get_async_client(), request, cached_completion_async)
         else:
-            # It's an order - process normally
-            return {
-                "type": "order",
-                "response": None,  # Will be generated after processing
-                "original_message": message,
-                "restaurant_name": restaurant_name
-            }
-            
+            content = await cached_completion_async(get_async_client(), **request)
+        return _agent_result(_message_type(content), message, restaurant_name)
     except Exception as e:
-        print(f"Error in conversational agent: {e}")
+        logger.error("Error in conversational agent: %s", e)
         # Default to treating as order if classification fails
-        return {
-            "type": "order",
-            "response": None,
-            "original_message": message,
-            "restaurant_name": restaurant_name
-        }
+        return _agent_result("order", message, restaurant_name)
 
 
 def get_welcome_message(restaurant_name: str, order_day: str = None) -> str:
@@ -1,16 +1,39 @@
 
-from .client import client
+import asyncio
+import os
+import re
+from collections import Counter
+
+from .client import client, get_async_client
+from .cache import cached_completion, cached_completion_async
+import numpy as np
 from rapidfuzz import fuzz, process
 from metaphone import doublemetaphone
 
+from src.catalog import catalog
+from src.logger import get_logger
 
-def suggest_product_ai(word: str, product_db: list[str]) -> str | None:
-    """ Use OpenAI to find the closest product in the catalog. """
-    if not client:
-        # Fall back to fuzzy matching if OpenAI is not available
-        return suggest_product_fuzzy(word, product_db)
-    
-    product_list_str = "\n".join(f"- {p}" for p in product_db)
+logger = get_logger(__name__)
+
+# Below this trigram similarity the shortlist is only a guess ("Donia" for
+# Coriander, "eggplant" for Aubergine), so the model sees the whole catalog
+AI_SHORTLIST_MIN_SIMILARITY = float(os.getenv("AI_SHORTLIST_MIN_SIMILARITY", 0.5))
+
+
+def _index_for(key: str, product_db: list[str] | None, build):
+    """Return the catalog-wide index for `key`, or an ad-hoc one.
+
+    Indexes over the catalog are built once per catalog version. A caller
+    passing its own product list (anything other than the catalog names)
+    gets an index built for that list only.
+    """
+    if product_db is None or product_db == catalog.names():
+        return catalog.derived(key, lambda rows: build([name for name, _ in rows]))
+    return build(product_db)
+
+
+def _matcher_request(word: str, candidates: list[str]) -> dict:
+    product_list_str = "\n".join(f"- {p}" for p in candidates)
 
     prompt = f"""
     You are a product matcher. 
@@ -33,34 +56,249 @@ Rules:
 
     
     """
+    return {
+        "model": "gpt-4o-mini",   # fast + cheap
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 20,
+        "temperature": 0
+    }
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",   # fast + cheap
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=20,
-        temperature=0
-    )
 
-    suggestion = response.choices[0].message.content.strip()
+def _suggestion(content: str) -> str | None:
+    suggestion = content.strip()
     return None if suggestion.lower() == "none" else suggestion
 
-def suggest_product_fuzzy(word: str, product_db: list[str], score_cutoff: int = 25) -> str | None:
+
+def suggest_product_ai(word: str, product_db: list[str]) -> str | None:
+    """ Use OpenAI to find the closest product in the catalog. """
+    if not client:
+        # Fall back to fuzzy matching if OpenAI is not available
+        return suggest_product_fuzzy(word, product_db)
+    
+    return _suggestion(cached_completion(client, **_matcher_request(word, ai_candidates(word, product_db))))
+
+
+async def suggest_product_ai_async(word: str, product_db: list[str], max_retries: int = None) -> str | None:
+    """
+    Awaitable suggest_product_ai() using the event loop's AsyncOpenAI client.
+    `max_retries` overrides the client's retry count, e.g. 0 under a deadline.
+    """
+    async_client = get_async_client()
+    if not async_client:
+        return suggest_product_fuzzy(word, product_db)
+    if max_retries is not None:
+        async_client = async_client.with_options(max_retries=max_retries)
+
+    request = _matcher_request(word, ai_candidates(word, product_db))
+    return _suggestion(await cached_completion_async(async_client, **request))
+
+
+# Placeholder for words whose AI match was cut off by the timeout
+AI_MATCH_SKIPPED = object()
+
+
+async def suggest_products_ai_concurrently(words: list[str], product_db: list[str] = None,
+                                           timeout: float = None) -> list:
+    """
+    Match several raw words at once, at most AI_CONCURRENCY calls in flight.
+    A failed call yields None for that word instead of failing the batch.
+    Matches still running after `timeout` seconds are cancelled and yield
+    AI_MATCH_SKIPPED; with a timeout the SDK does not retry, since a retry
+    would start over with the full request timeout.
+    """
+    max_retries = 0 if timeout is not None else None
+
+    async def match(word):
+        try:
+            return await suggest_product_ai_async(word, product_db, max_retries)
+        except Exception as e:
+            logger.warning("⚠️  AI product match failed for '%s': %s", word, e)
+            return None
+
+    if not words:
+        return []
+    tasks = [asyncio.ensure_future(match(word)) for word in words]
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.info("⏱️  %s AI product match(es) cut off after %.2fs", len(pending), timeout)
+    return [AI_MATCH_SKIPPED if task in pending else task.result() for task in tasks]
+
+
+class FuzzyIndex:
+    """Catalog names pre-normalized once for RapidFuzz scoring."""
+
+    def __init__(self, names: list[str]):
+        self.names = list(names)
+        self.clean = [p.strip().lower() for p in self.names]
+
+
+def suggest_product_fuzzy(word: str, product_db: list[str] = None, score_cutoff: int = 25) -> str | None:
     """
     Use RapidFuzz to find the closest product in the catalog.
     """
     word_clean = word.strip().lower()
-    db_clean = [p.strip().lower() for p in product_db]
 
-    match = process.extractOne(word_clean, db_clean, scorer=fuzz.WRatio, score_cutoff=score_cutoff)
+    # An exact name in the trigram shortlist settles it. Anything below 100
+    # can tie with, or lose to, a product outside the shortlist, so those
+    # words are scored against the whole catalog like before.
+    candidates = candidate_products(word, product_db)
+    match = process.extractOne(word_clean, [p.strip().lower() for p in candidates],
+                               scorer=fuzz.WRatio, score_cutoff=100)
     if match:
-        original_index = db_clean.index(match[0])
-        return product_db[original_index]
-    return None
+        return candidates[match[2]]
 
-def phonetic_match(word: str, product_db: list[str]) -> str | None:
-    word_code = doublemetaphone(word)[0]
-    for p in product_db:
-        if doublemetaphone(p)[0] == word_code:
-            return p
+    index = _index_for("fuzzy_index", product_db, FuzzyIndex)
+    match = process.extractOne(word_clean, index.clean, scorer=fuzz.WRatio, score_cutoff=score_cutoff)
+    if match:
+        return index.names[match[2]]
     return None
 
+
+def suggest_products_fuzzy_batch(words: list[str], product_db: list[str] = None,
+                                 limit: int = 3, score_cutoff: int = 25) -> list[list[tuple[str, float]]]:
+    """
+    Score every word against the catalog in one vectorized RapidFuzz pass.
+
+    Returns one list per input word with up to `limit` (product, score) pairs,
+    best first. Ties keep catalog order, so the first candidate is what
+    suggest_product_fuzzy() would return for that word.
+    """
+    index = _index_for("fuzzy_index", product_db, FuzzyIndex)
+    if not words or not index.names:
+        return [[] for _ in words]
+
+    queries = [word.strip().lower() for word in words]
+    scores = process.cdist(queries, index.clean, scorer=fuzz.WRatio,
+                           score_cutoff=score_cutoff, workers=-1)
+
+    results = []
+    for row in scores:
+        best = np.argsort(-row, kind="stable")[:limit]
+        results.append([(index.names[i], float(row[i])) for i in best if row[i] >= score_cutoff])
+    return results
+
+
+class PhoneticIndex:
+    """Double Metaphone code -> products, built once per catalog version.
+
+    Both the primary and the alternate code of every product are indexed,
+    so a lookup is a couple of dictionary hits instead of encoding the whole
+    catalog.
+    """
+
+    def __init__(self, names: list[str]):
+        self.names = list(names)
+        self._codes = {}
+        for i, name in enumerate(self.names):
+            primary, alternate = doublemetaphone(name)
+            if primary:
+                self._codes.setdefault(primary, []).append((i, 0))
+            if alternate and alternate != primary:
+                self._codes.setdefault(alternate, []).append((i, 1))
+
+    def candidates(self, word: str, limit: int = 5) -> list[str]:
+        """Return products sounding like `word`, best first.
+
+        Primary/primary code matches rank above matches through an alternate
+        code. Products in the same tier are ordered by spelling similarity,
+        then catalog order.
+        """
+        primary, alternate = doublemetaphone(word)
+        tiers = {}
+        for word_tier, code in ((0, primary), (1, alternate)):
+            if not code:
+                continue
+            for i, name_tier in self._codes.get(code, ()):
+                tier = word_tier + name_tier
+                if tier < tiers.get(i, 3):
+                    tiers[i] = tier
+
+        word_clean = word.strip().lower()
+        ranked = sorted(
+            tiers,
+            key=lambda i: (tiers[i], -fuzz.ratio(word_clean, self.names[i].lower()), i)
+        )
+        return [self.names[i] for i in ranked[:limit]]
+
+
+def phonetic_candidates(word: str, product_db: list[str] = None, limit: int = 5) -> list[str]:
+    """Ranked products whose Double Metaphone codes match `word`."""
+    return _index_for("phonetic_index", product_db, PhoneticIndex).candidates(word, limit)
+
+
+def phonetic_match(word: str, product_db: list[str] = None) -> str | None:
+    candidates = phonetic_candidates(word, product_db, limit=1)
+    return candidates[0] if candidates else None
+
+
+def _trigrams(text: str) -> set[str]:
+    """Character trigrams of each word, padded like pg_trgm ("  on", " on", ...)."""
+    grams = set()
+    for token in re.sub(r"[^a-z0-9\s]", " ", text.lower()).split():
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Trigram -> products inverted index for pruning the catalog.
+
+    A lookup only touches the postings of the word's own trigrams and ranks
+    products by Dice similarity, so fuzzy scoring and LLM prompts can work on
+    a short candidate list instead of the whole catalog.
+    """
+
+    def __init__(self, names: list[str]):
+        self.names = list(names)
+        self._sizes = []
+        self._postings = {}
+        for i, name in enumerate(self.names):
+            grams = _trigrams(name)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(i)
+
+    def ranked(self, word: str, limit: int = 15) -> list[tuple[str, float]]:
+        """Up to `limit` (product, Dice similarity) pairs sharing a trigram with `word`, best first."""
+        grams = _trigrams(word)
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        similarity = {i: 2 * count / (len(grams) + self._sizes[i]) for i, count in shared.items()}
+        ranked = sorted(similarity, key=lambda i: (-similarity[i], i))
+        return [(self.names[i], similarity[i]) for i in ranked[:limit]]
+
+    def candidates(self, word: str, limit: int = 15) -> list[str]:
+        return [name for name, _ in self.ranked(word, limit)]
+
+
+def candidate_products(word: str, product_db: list[str] = None, limit: int = 15) -> list[str]:
+    """
+    Short list of plausible products for `word`: the best trigram matches,
+    plus sound-alike products that share few letters with the typed word.
+    """
+    candidates = _index_for("trigram_index", product_db, TrigramIndex).candidates(word, limit)
+    for product in phonetic_candidates(word, product_db, limit=5):
+        if product not in candidates:
+            candidates.append(product)
+    return candidates
+
+
+def ai_candidates(word: str, product_db: list[str] = None) -> list[str]:
+    """
+    Products to show the LLM for `word`: the candidate shortlist when the
+    word clearly resembles something in the catalog, otherwise the whole
+    catalog, so the model can still make semantic matches that share no
+    letters with the typed word.
+    """
+    best = _index_for("trigram_index", product_db, TrigramIndex).ranked(word, limit=1)
+    if not best or best[0][1] < AI_SHORTLIST_MIN_SIMILARITY:
+        return list(product_db) if product_db is not None else catalog.names()
+    return candidate_products(word, product_db)
@@ -1,16 +1,14 @@
-from openai import OpenAI
-import os
+import asyncio
 import json
-from src.parser import get_primary_units, get_products
+from src.ai.cache import cached_completion, cached_completion_async
+from src.ai.client import client, get_async_client
+from src.budget import LatencyBudget
+from src.catalog import catalog
+from src.parser import get_primary_units
 import re
+from src.logger import get_logger
 
-# Initialize client only if API key is available
-_api_key = os.getenv("OPENAI_API_KEY")
-if _api_key:
-    client = OpenAI(api_key=_api_key)
-else:
-    client = None
-    print("⚠️  Warning: OPENAI_API_KEY not set in order_parser. AI parsing will be disabled.")
+logger = get_logger(__name__)
 
 UNIT_MAP = {
         "p": "Pieces",
@@ -28,13 +26,7 @@ UNIT_MAP = {
         "bunch": "Pieces"
     }
 
-def ai_parse_order(message: str) -> dict:
-    """
-    Uses OpenAI to parse an unstructured order raw_message into structured fields.
-    """
-    if not client:
-        raise ValueError("OpenAI client not initialized. Please set OPENAI_API_KEY environment variable.")
-    
+def _parse_request(message: str) -> dict:
     prompt = f"""
     You are an order parsing assistant. 
 Extract all items from the raw_message. Each item must include: action (add/remove), quantity, unit, product.
@@ -50,18 +42,49 @@ Return ONLY valid JSON, in this exact format:
   ]
 }}
     """
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": prompt}],
+        "response_format": {"type": "json_object"},
+        "temperature": 0,
+        "timeout": 15.0  # 15 second timeout for full order parsing
+    }
+
+def ai_parse_order(message: str) -> dict:
+    """
+    Uses OpenAI to parse an unstructured order raw_message into structured fields.
+    """
+    if not client:
+        raise ValueError("OpenAI client not initialized. Please set OPENAI_API_KEY environment variable.")
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            timeout=15.0  # 15 second timeout for full order parsing
-        )
+        content = cached_completion(client, **_parse_request(message))
     except Exception as e:
         raise ValueError(f"AI parsing failed: {e}")
 
-    parsed = json.loads(response.choices[0].message.content)
+    parsed = json.loads(content)
+    return parsed.get("items", [])
+
+async def _complete_async(request: dict, budget: LatencyBudget = None) -> str:
+    """cached_completion_async() on the loop's client, bounded by `budget` when given."""
+    if budget:
+        return await budget.call(get_async_client(), request, cached_completion_async)
+    return await cached_completion_async(get_async_client(), **request)
+
+async def ai_parse_order_async(message: str, budget: LatencyBudget = None) -> dict:
+    """Awaitable ai_parse_order() using the event loop's AsyncOpenAI client."""
+    if not get_async_client():
+        raise ValueError("OpenAI client not initialized. Please set OPENAI_API_KEY environment variable.")
+    if budget and not budget.allows_ai():
+        budget.skip("parse", [message])
+        raise ValueError("latency budget exhausted")
+
+    try:
+        content = await _complete_async(_parse_request(message), budget)
+    except Exception as e:
+        raise ValueError(f"AI parsing failed: {e}")
+
+    parsed = json.loads(content)
     return parsed.get("items", [])
 
 def get_unit_abbreviations():
@@ -72,29 +95,157 @@ def get_unit_abbreviations():
     # Make a string for the prompt
     return "\n".join([f"{fullname} → {abbr}" for fullname, abbr in reverse_map.items()])
 
+def _lower_product_names() -> list[str]:
+    return catalog.derived("lower_names", lambda rows: [name.lower() for name, _ in rows])
+
 def is_order_line(line: str) -> bool:
     """Check if a line looks like an order (quantity or product match)."""
     if re.search(r"\d+", line):  # has a number
         return True
-    products = [name.lower() for name, _ in get_products()]
+    products = _lower_product_names()
     text = line.lower()
     return any(p in text for p in products)
 
-def normalize_order(raw_message: str) -> tuple[str, dict[str, str]]:
+def _normalization_rules(unit_abbr_str: str, unit_map_str: str) -> str:
+    return f"""
+                - Always: <quantity><PRIMARY unit abbreviation> <Product>
+                  (e.g., 3bg Onion, 1bx Tomato)
+                - If client provides a valid unit (from this list), keep it:
+                {unit_abbr_str}
+                - If no unit is given, use the product's PRIMARY unit:
+                {unit_map_str}
+                - If no quantity is present, return the input exactly as-is.
+                - Do not invent or assume a quantity.
+                - Convert fractions like ½ to decimals (0.5).
+                - Capitalize product names properly.
+                
+                e.g:
+                - "CARROT-5kg" -> "5kg Carrot" 
+                """
+
+def _line_request(original_line: str, unit_abbr_str: str, unit_map_str: str) -> dict:
+    prompt = f"""
+                You are an order text normalizer.
+                Convert this order line into a clean format:
+                {_normalization_rules(unit_abbr_str, unit_map_str)}
+                - Output only the normalized line, no commentary.
+
+                Input: {original_line}
+                Output:
+                """
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0,
+        "timeout": 10.0  # 10 second timeout per line
+    }
+
+def _line_reply(content: str) -> str:
+    normalized = content.strip()
+    return normalized.replace("```", "").replace("'''", "").strip()
+
+def _normalize_line(original_line: str, unit_abbr_str: str, unit_map_str: str) -> str:
+    """Normalize a single order line. Returns the original line if the call fails."""
+    try:
+        content = cached_completion(client, **_line_request(original_line, unit_abbr_str, unit_map_str))
+    except Exception as e:
+        # If normalization fails, use original line
+        logger.warning("⚠️  Normalization failed for line '%s': %s", original_line, e)
+        return original_line
+    return _line_reply(content)
+
+async def _normalize_line_async(original_line: str, unit_abbr_str: str, unit_map_str: str,
+                                budget: LatencyBudget = None) -> str:
+    try:
+        content = await _complete_async(_line_request(original_line, unit_abbr_str, unit_map_str), budget)
+    except Exception as e:
+        logger.warning("⚠️  Normalization failed for line '%s': %s", original_line, e)
+        if budget:
+            budget.skip("normalization", [original_line])
+        return original_line
+    return _line_reply(content)
+
+def _batch_request(lines: list[str], unit_abbr_str: str, unit_map_str: str) -> dict:
+    numbered = json.dumps([{"index": i, "input": line} for i, line in enumerate(lines)], ensure_ascii=False)
+    prompt = f"""
+                You are an order text normalizer.
+                Convert EACH of the order lines below into a clean format:
+                {_normalization_rules(unit_abbr_str, unit_map_str)}
+                - Normalize every line independently and keep its index.
+
+                Lines (JSON):
+                {numbered}
+
+                Return ONLY valid JSON, in this exact format:
+                {{"lines": [{{"index": 0, "output": "..."}}, {{"index": 1, "output": "..."}}]}}
+                """
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [{"role": "user", "content": prompt}],
+        "response_format": {"type": "json_object"},
+        "temperature": 0,
+        "timeout": 15.0  # one timeout for the whole message
+    }
+
+def _batch_reply(content: str, lines: list[str]) -> list[str | None]:
+    results = [None] * len(lines)
+    items = json.loads(content).get("lines")
+    if not isinstance(items, list):
+        return results
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        index, output = item.get("index"), item.get("output")
+        if isinstance(index, int) and 0 <= index < len(lines) and isinstance(output, str) and output.strip():
+            results[index] = output.replace("```", "").strip()
+
+    malformed = results.count(None)
+    if malformed:
+        logger.warning("⚠️  Batch normalization returned %s malformed line(s), retrying them one by one", malformed)
+    return results
+
+def _normalize_lines_batch(lines: list[str], unit_abbr_str: str, unit_map_str: str) -> list[str | None]:
     """
-    Normalizes messy order input into clean, parser-friendly lines.
-    Example: "ONION-3" -> "3 bg Onion"
-    Returns: (normalized_text, mapping of normalized_line -> original_line)
+    Normalize all order lines of a message with one JSON-structured request.
+
+    Returns a list aligned with `lines`. Entries the model left out or
+    returned malformed are None, so the caller can retry just those lines.
+    If the request itself fails, every line is kept as-is.
+    """
+    if not lines:
+        return []
+    try:
+        content = cached_completion(client, **_batch_request(lines, unit_abbr_str, unit_map_str))
+        return _batch_reply(content, lines)
+    except Exception as e:
+        logger.warning("⚠️  Batch normalization failed for %s lines: %s", len(lines), e)
+        return list(lines)
+
+async def _normalize_lines_batch_async(lines: list[str], unit_abbr_str: str, unit_map_str: str,
+                                       budget: LatencyBudget = None) -> list[str | None]:
+    if not lines:
+        return []
+    try:
+        content = await _complete_async(_batch_request(lines, unit_abbr_str, unit_map_str), budget)
+        return _batch_reply(content, lines)
+    except Exception as e:
+        logger.warning("⚠️  Batch normalization failed for %s lines: %s", len(lines), e)
+        if budget:
+            budget.skip("normalization", lines)
+        return list(lines)
+
+def _plan_normalization(raw_message: str, openai_client):
+    """
+    Decide whether a message needs the model at all.
+
+    Returns (result, None) when the message can be returned as-is, otherwise
+    (None, (original_lines, order_lines, unit_abbr_str, unit_map_str)).
     """
-    if not client:
-        # If OpenAI is not available, return original message with identity mapping
-        lines = [line.strip() for line in raw_message.splitlines() if line.strip()]
-        line_mapping = {line: line for line in lines}
-        return raw_message, line_mapping
-    
     original_lines = [line.strip() for line in raw_message.splitlines() if line.strip()]
-    normalized_lines = []
-    line_mapping = {}  # Maps normalized line -> original line
+    if not openai_client:
+        # If OpenAI is not available, return original message with identity mapping
+        return (raw_message, {line: line for line in original_lines}), None
     
     # Quick check: if all lines already look like clean orders, skip normalization
     # This avoids unnecessary API calls for already-clean orders
@@ -102,7 +253,7 @@ def normalize_order(raw_message: str) -> tuple[str, dict[str, str]]:
     # 1. Has a unit abbreviation, OR
     # 2. Has a product name that matches our product list
     all_lines_clean = True
-    products = [name.lower() for name, _ in get_products()]
+    products = _lower_product_names()
     for line in original_lines:
         if is_order_line(line):
             has_number = bool(re.search(r'\d+', line))
@@ -118,61 +269,27 @@ def normalize_order(raw_message: str) -> tuple[str, dict[str, str]]:
     
     # If all lines are already clean, return as-is (skip expensive normalization)
     if all_lines_clean:
-        print("✅ Order already in clean format, skipping normalization")
-        for line in original_lines:
-            normalized_lines.append(line)
-            line_mapping[line] = line
-        return raw_message, line_mapping
+        logger.info("✅ Order already in clean format, skipping normalization")
+        return (raw_message, {line: line for line in original_lines}), None
     
-    # Otherwise, normalize each line that needs it
+    # Otherwise, normalize all lines that need it in one request
     primary_units = get_primary_units()
     unit_map_str = "\n".join([f"{prod} → {unit}" for prod, unit in primary_units.items()])
     unit_abbr_str = get_unit_abbreviations()
+    order_lines = list(dict.fromkeys(line for line in original_lines if is_order_line(line)))
+    return None, (original_lines, order_lines, unit_abbr_str, unit_map_str)
+
+def _assemble_normalized(original_lines: list[str], normalized_by_line: dict[str, str]) -> tuple[str, dict[str, str]]:
+    normalized_lines = []
+    line_mapping = {}  # Maps normalized line -> original line
 
     for original_line in original_lines:
-        if not is_order_line(original_line):
+        if original_line not in normalized_by_line:
             normalized_lines.append(original_line)
             line_mapping[original_line] = original_line  # Non-order lines stay the same
             continue
 
-        prompt = f"""
-                You are an order text normalizer.
-                Convert this order line into a clean format:
-                - Always: <quantity><PRIMARY unit abbreviation> <Product>
-                  (e.g., 3bg Onion, 1bx Tomato)
-                - If client provides a valid unit (from this list), keep it:
-                {unit_abbr_str}
-                - If no unit is given, use the product's PRIMARY unit:
-                {unit_map_str}
-                - If no quantity is present, return the input exactly as-is.
-                - Do not invent or assume a quantity.
-                - Convert fractions like ½ to decimals (0.5).
-                - Capitalize product names properly.
-                - Output only the normalized line, no commentary.
-                
-                e.g:
-                - "CARROT-5kg" -> "5kg Carrot" 
-
-                Input: {original_line}
-                Output:
-                """
-
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                timeout=10.0  # 10 second timeout per line
-            )
-        except Exception as e:
-            # If normalization fails, use original line
-            print(f"⚠️  Normalization failed for line '{original_line}': {e}")
-            normalized_lines.append(original_line)
-            line_mapping[original_line] = original_line
-            continue
-
-        normalized = response.choices[0].message.content.strip()
-        normalized = normalized.replace("```", "").replace("'''", "").strip()
-
+        normalized = normalized_by_line[original_line]
         if normalized:  # only add if non-empty
             normalized_lines.append(normalized)
             line_mapping[normalized] = original_line  # Map normalized -> original
@@ -180,3 +297,55 @@ def normalize_order(raw_message: str) -> tuple[str, dict[str, str]]:
     # Join back into one clean string
     normalized_text = "\n".join(normalized_lines)
     return normalized_text, line_mapping
+
+def normalize_order(raw_message: str) -> tuple[str, dict[str, str]]:
+    """
+    Normalizes messy order input into clean, parser-friendly lines.
+    Example: "ONION-3" -> "3 bg Onion"
+    Returns: (normalized_text, mapping of normalized_line -> original_line)
+    """
+    result, plan = _plan_normalization(raw_message, client)
+    if result:
+        return result
+
+    original_lines, order_lines, unit_abbr_str, unit_map_str = plan
+    results = _normalize_lines_batch(order_lines, unit_abbr_str, unit_map_str)
+    for i, line in enumerate(order_lines):
+        if results[i] is None:
+            # Malformed or missing in the batch reply: normalize this line on its own
+            results[i] = _normalize_line(line, unit_abbr_str, unit_map_str)
+
+    return _assemble_normalized(original_lines, dict(zip(order_lines, results)))
+
+async def normalize_order_async(raw_message: str, budget: LatencyBudget = None) -> tuple[str, dict[str, str]]:
+    """
+    Awaitable normalize_order(); malformed lines are retried concurrently.
+    With too little of the latency budget left, lines are kept as typed and
+    recorded as skipped "normalization" items on the budget.
+    """
+    result, plan = _plan_normalization(raw_message, get_async_client())
+    if result:
+        return result
+
+    original_lines, order_lines, unit_abbr_str, unit_map_str = plan
+    if budget and not budget.allows_ai():
+        logger.info("⏱️  Latency budget low, skipping normalization")
+        budget.skip("normalization", order_lines)
+        return raw_message, {line: line for line in original_lines}
+
+    results = await _normalize_lines_batch_async(order_lines, unit_abbr_str, unit_map_str, budget)
+    retry = [i for i, normalized in enumerate(results) if normalized is None]
+    if retry and budget and not budget.allows_ai():
+        # No time for the per-line retries: keep those lines as typed
+        for i in retry:
+            results[i] = order_lines[i]
+        budget.skip("normalization", [order_lines[i] for i in retry])
+        retry = []
+    if retry:
+        retried = await asyncio.gather(*(
+            _normalize_line_async(order_lines[i], unit_abbr_str, unit_map_str, budget) for i in retry
+        ))
+        for i, normalized in zip(retry, retried):
+            results[i] = normalized
+
+    return _assemble_normalized(original_lines, dict(zip(order_lines, results)))
@@ -1,25 +1,173 @@
-
 import os
+import queue
+import random
+import threading
+import time
 from twilio.rest import Client
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# "twilio" sends WhatsApp messages; "stub" only records them (tests, local runs)
+ALERT_TRANSPORT = os.getenv("ALERT_TRANSPORT", "twilio")
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", 3))
+ALERT_RETRY_BASE = float(os.getenv("ALERT_RETRY_BASE", 2))
+# Upper bound on notifications sent to the manager per minute
+ALERT_RATE_PER_MINUTE = float(os.getenv("ALERT_RATE_PER_MINUTE", 30))
+
+
+class TwilioTransport:
+    """Sends alerts over WhatsApp with one Twilio client (and HTTP session) per process."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self) -> Client:
+        with self._lock:
+            if self._client is None:
+                self._client = Client(
+                    os.getenv("TWILIO_ACCOUNT_SID"),
+                    os.getenv("TWILIO_AUTH_TOKEN")
+                )
+            return self._client
+
+    def send(self, body: str):
+        self._get_client().messages.create(
+            from_=os.getenv("TWILIO_WHATSAPP_NUMBER"),
+            to=os.getenv("MANAGER_WHATSAPP_NUMBER"),
+            body=body
+        )
+
+
+class StubTransport:
+    """Keeps alerts in memory instead of sending them."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, body: str):
+        self.sent.append(body)
+        logger.info("📨 [stub] Manager alert:\n%s", body)
+
+
+def format_alert(restaurant: str, alerts: list[tuple[str, list[str]]]) -> str:
+    """One notification for all (raw_message, errors) alerts of a message."""
+    if len(alerts) == 1:
+        raw_message, errors = alerts[0]
+        return (
+            "🚨 ORDER ALERT 🚨\n\n"
+            f"Restaurant: {restaurant}\n"
+            f"Original message: {raw_message}\n"
+            f"Issues: {', '.join(errors)}"
+        )
+
+    lines = [
+        "🚨 ORDER ALERT 🚨\n",
+        f"Restaurant: {restaurant}",
+        f"{len(alerts)} lines need attention:"
+    ]
+    for raw_message, errors in alerts:
+        lines.append(f"- {raw_message}: {', '.join(errors)}")
+    return "\n".join(lines)
+
+
+class AlertDispatcher:
+    """
+    Sends manager alerts from a background thread.
+
+    notify() takes every alert raised while processing one inbound message
+    and queues a single notification for it, so the webhook never waits on
+    Twilio. The sender thread spaces notifications to ALERT_RATE_PER_MINUTE
+    and retries failed sends with jittered exponential backoff.
+    """
+
+    def __init__(self, transport=None, max_retries: int = ALERT_MAX_RETRIES,
+                 rate_per_minute: float = ALERT_RATE_PER_MINUTE):
+        self.transport = transport or (StubTransport() if ALERT_TRANSPORT == "stub" else TwilioTransport())
+        self.max_retries = max_retries
+        self.min_interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._last_sent = 0.0
+        self._lock = threading.Lock()
+
+    def notify(self, restaurant: str, alerts: list[tuple[str, list[str]]]):
+        """Queue one notification covering all (raw_message, errors) alerts."""
+        if not alerts:
+            return
+        self.start()
+        with self._lock:
+            self.coalesced += len(alerts) - 1
+        self._queue.put(format_alert(restaurant, alerts))
+
+    def start(self):
+        """Start the sender thread if it is not running (notify() also does this)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued notification has been handled. Returns False on timeout."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _run(self):
+        while True:
+            body = self._queue.get()
+            try:
+                self._send(body)
+            finally:
+                self._queue.task_done()
+
+    def _send(self, body: str):
+        for attempt in range(self.max_retries + 1):
+            wait = self._last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.transport.send(body)
+                self._last_sent = time.monotonic()
+                self.sent += 1
+                return
+            except Exception as e:
+                self._last_sent = time.monotonic()
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error("❌ Manager alert failed after %s attempt(s): %s", attempt + 1, e)
+                    return
+                delay = random.uniform(0, ALERT_RETRY_BASE * 2 ** attempt)
+                logger.warning("⚠️  Manager alert failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "transport": type(self.transport).__name__,
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced": self.coalesced
+        }
+
+
+alert_dispatcher = AlertDispatcher()
+
 
 def send_manager_alert(restaurant: str, raw_message: str, errors: list[str]):
     """
     Send WhatsApp alert to the manager when red alert conditions are met.
+    Queued on the alert dispatcher; returns immediately.
     """
-    client = Client(
-        os.getenv("TWILIO_ACCOUNT_SID"),
-        os.getenv("TWILIO_AUTH_TOKEN")
-    )
-
-    body = (
-        "🚨 ORDER ALERT 🚨\n\n"
-        f"Restaurant: {restaurant}\n"
-        f"Original message: {raw_message}\n"
-        f"Issues: {', '.join(errors)}"
-    )
-
-    client.messages.create(
-        from_=os.getenv("TWILIO_WHATSAPP_NUMBER"),
-        to=os.getenv("MANAGER_WHATSAPP_NUMBER"),
-        body=body
-    )
+    alert_dispatcher.notify(restaurant, [(raw_message, errors)])
+
+
+def get_alert_stats() -> dict:
+    return alert_dispatcher.stats()
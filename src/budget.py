@@ -0,0 +1,74 @@
+import asyncio
+import os
+import time
+
+# Per-message latency budget for the webhook, in seconds
+ORDER_LATENCY_BUDGET = float(os.getenv("ORDER_LATENCY_BUDGET", 3.0))
+# Below this much time left, AI tiers are skipped in favour of local ones
+AI_MIN_REMAINING = float(os.getenv("AI_MIN_REMAINING", 0.75))
+
+
+class LatencyBudget:
+    """
+    Deadline for processing one inbound message.
+
+    AI calls ask `allows_ai()` before starting and run through `call()`, so
+    a slow OpenAI response eats into the budget instead of blocking the
+    webhook. When the budget runs low, the pipeline drops to the local tiers
+    (learned corrections, phonetic, fuzzy) and flags the affected lines for
+    review. Whatever was skipped is recorded with `skip()` and reported in
+    `summary()`.
+    """
+
+    def __init__(self, seconds: float = ORDER_LATENCY_BUDGET, min_ai_seconds: float = AI_MIN_REMAINING):
+        self.seconds = seconds
+        self.min_ai_seconds = min_ai_seconds
+        self.started = time.monotonic()
+        self.skipped = {}
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(self.seconds - self.elapsed(), 0.0)
+
+    def allows_ai(self) -> bool:
+        return self.remaining() >= self.min_ai_seconds
+
+    def timeout(self, cap: float) -> float:
+        """Timeout for the next call: its usual cap, or whatever budget is left."""
+        return max(min(cap, self.remaining()), 0.1)
+
+    def limit(self, request: dict, cap: float = 10.0) -> dict:
+        """Cap the `timeout` of a chat completion request to the remaining budget."""
+        request["timeout"] = self.timeout(request.get("timeout", cap))
+        return request
+
+    async def call(self, openai_client, request: dict, complete):
+        """
+        Run `complete(client, **request)` within the remaining budget.
+
+        SDK retries are turned off: each retry gets the full request timeout
+        again and would run past the deadline. The whole call, including the
+        wait for an AI concurrency slot, is cancelled when the budget runs out
+        and raises TimeoutError.
+        """
+        self.limit(request)
+        return await asyncio.wait_for(
+            complete(openai_client.with_options(max_retries=0), **request),
+            timeout=self.timeout(request["timeout"])
+        )
+
+    def skip(self, tier: str, items: list):
+        """Record the items (lines, words) a tier did not get to."""
+        if items:
+            self.skipped.setdefault(tier, []).extend(items)
+
+    def was_skipped(self, tier: str, item) -> bool:
+        return item in self.skipped.get(tier, ())
+
+    def summary(self) -> dict:
+        summary = {"budget_s": self.seconds, "elapsed_s": round(self.elapsed(), 3)}
+        if self.skipped:
+            summary["skipped"] = {tier: len(items) for tier, items in self.skipped.items()}
+        return summary
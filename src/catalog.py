@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+
+from src.db import fetch_products, fetch_products_version
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# How long (seconds) the cached catalog is trusted before we ask the database
+# whether the products table changed. Override with PRODUCT_CACHE_TTL.
+DEFAULT_TTL = float(os.getenv("PRODUCT_CACHE_TTL", 60))
+
+
+class ProductCatalog:
+    """In-process cache of the products table.
+
+    Rows are loaded once and served from memory. After `ttl` seconds the next
+    read runs a cheap version query (see src.db.fetch_products_version) and
+    only re-reads the table when the fingerprint changed. `reload()` forces a
+    fresh read, e.g. after editing products.
+
+    Lookup structures built from the rows (matchers, unit indexes, ...) are
+    registered with `derived()` and rebuilt automatically on a version change.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self.version = None
+        self._rows = []
+        self._loaded = False
+        self._checked_at = 0.0
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def products(self) -> list[tuple]:
+        """Return [(name, unit_synonyms), ...], refreshing if stale."""
+        self._refresh_if_stale()
+        return self._rows
+
+    def names(self) -> list[str]:
+        """Return the product names in catalog order."""
+        return self.derived("names", lambda rows: [name for name, _ in rows])
+
+    def derived(self, key: str, build):
+        """Return `build(rows)`, cached until the catalog version changes."""
+        self._refresh_if_stale()
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self._rows)
+            return self._derived[key]
+
+    def reload(self) -> list[tuple]:
+        """Force a fresh read of the products table."""
+        with self._lock:
+            self._load(fetch_products_version())
+            return self._rows
+
+    def _refresh_if_stale(self):
+        if self._loaded and time.monotonic() - self._checked_at < self.ttl:
+            return
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._loaded and time.monotonic() - self._checked_at < self.ttl:
+                return
+
+            version = fetch_products_version()
+            if self._loaded and (version is None or version == self.version):
+                # Unchanged (or DB unreachable): keep serving what we have
+                self._checked_at = time.monotonic()
+                return
+
+            self._load(version)
+
+    def _load(self, version):
+        rows = fetch_products()
+        if rows is None:
+            # Keep the previous catalog; retry on the next read if we never loaded
+            return
+
+        self._rows = rows
+        self.version = version
+        self._derived = {}
+        self._loaded = True
+        self._checked_at = time.monotonic()
+        logger.info("📦 Product catalog loaded: %s products (version %s)", len(rows), version)
+
+
+catalog = ProductCatalog()
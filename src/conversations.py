@@ -2,6 +2,9 @@ from datetime import datetime
 from collections import defaultdict
 from src.saver import get_database_engine
 import pandas as pd
+from src.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 def get_all_conversations(filepath=None):
@@ -49,7 +52,7 @@ def get_all_conversations(filepath=None):
             """
             df_conversations = pd.read_sql(conversations_query, engine)
         except Exception as e:
-            print(f"⚠️  Could not load conversations table (may not exist yet): {e}")
+            logger.warning("⚠️  Could not load conversations table (may not exist yet): %s", e)
             df_conversations = pd.DataFrame()
         
         # First pass: collect all rows and group by (restaurant_name, timestamp)
@@ -236,9 +239,7 @@ def get_all_conversations(filepath=None):
                 })
         
     except Exception as e:
-        print(f"⚠️  Error loading conversations from database: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("⚠️  Error loading conversations from database: %s", e)
         return []
     
     # Convert to list format with last message info
@@ -0,0 +1,221 @@
+import csv
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from src.catalog import catalog
+from src.logger import PROJECT_ROOT, get_logger
+from src.parser import UNIT_MAP
+from src.saver import get_database_engine
+
+logger = get_logger(__name__)
+
+# How long (seconds) a worker trusts its in-memory copy before re-reading the
+# table, so corrections learned by other workers show up. CORRECTION_CACHE_TTL.
+DEFAULT_TTL = float(os.getenv("CORRECTION_CACHE_TTL", 300))
+
+_UNITS = "|".join(sorted(map(re.escape, UNIT_MAP), key=len, reverse=True))
+_QUANTITY_PREFIX = re.compile(rf"^\d+(?:\.\d+)?\s*(?:(?:{_UNITS})s?\b)?")
+_CSV_CORRECTION = re.compile(r"Product corrected from '(.+?)' to '(.+?)'")
+
+
+def correction_key(raw_word: str) -> str:
+    """
+    Normalize a raw order line/word into a cache key.
+    Example: "5kg Brocoli!" -> "brocoli"
+    """
+    if not raw_word:
+        return ""
+    clean = raw_word.strip().lower()
+    clean = _QUANTITY_PREFIX.sub("", clean)
+    clean = re.sub(r"[^a-z0-9\s]", " ", clean)
+    return " ".join(clean.split())
+
+
+def _name_set(rows):
+    return {name for name, _ in rows}
+
+
+def _lower_name_set(rows):
+    return {name.lower() for name, _ in rows}
+
+
+class CorrectionCache:
+    """
+    Learned raw_word -> product mappings backed by the product_corrections table.
+
+    Lookups are served from memory and counted, so validate_order can skip the
+    AI matcher for misspellings we have already resolved. The table is seeded
+    once from corrections.csv and past restaurant_orders by a startup
+    migration (see src.migrations), never from the request path.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._mapping = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def lookup(self, raw_word: str, count: bool = True) -> str | None:
+        key = correction_key(raw_word)
+        if not key:
+            return None
+
+        self.refresh()
+        product = self._mapping.get(key)
+        # Ignore mappings to products that have since left the catalog
+        if product and product not in catalog.derived("name_set", _name_set):
+            product = None
+
+        if count:
+            with self._lock:
+                if product:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return product
+
+    def learn(self, raw_word: str, product: str, source: str = "operator") -> bool:
+        """Store (or overwrite) the mapping for raw_word. Returns True if stored."""
+        key = correction_key(raw_word)
+        if not key or not product or "\n" in raw_word.strip():
+            return False
+        # A catalog name edited to another product is a one-off choice, not a typo
+        if key in catalog.derived("lower_name_set", _lower_name_set):
+            return False
+
+        with get_database_engine().begin() as conn:
+            _upsert(conn, [(key, product, source)])
+        with self._lock:
+            self._mapping[key] = product
+        logger.info("🧠 Learned correction: '%s' -> '%s' (%s)", key, product, source)
+        return True
+
+    def reload(self):
+        with get_database_engine().connect() as conn:
+            rows = conn.execute(text("SELECT raw_word, product FROM product_corrections")).fetchall()
+
+        with self._lock:
+            self._mapping = {raw_word: product for raw_word, product in rows}
+            self._loaded_at = time.monotonic()
+        logger.info("🧠 Correction cache loaded: %s mappings", len(rows))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._mapping),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def refresh(self):
+        """Reload the mappings if they are older than `ttl`; a no-op while they are fresh."""
+        if self._is_fresh():
+            return
+        with self._reload_lock:
+            # Another thread may have reloaded while we waited for the lock
+            if self._is_fresh():
+                return
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the last copy (or nothing) if the database is down
+                logger.warning("⚠️  Could not load correction cache: %s", e)
+                self._loaded_at = time.monotonic()
+
+
+def _upsert(conn, mappings: list[tuple[str, str, str]]):
+    query = text("""
+        INSERT INTO product_corrections (raw_word, product, source, updated_at)
+        VALUES (:raw_word, :product, :source, :updated_at)
+        ON CONFLICT (raw_word) DO UPDATE
+        SET product = EXCLUDED.product,
+            source = EXCLUDED.source,
+            updated_at = EXCLUDED.updated_at
+    """)
+    now = datetime.now()
+    conn.execute(query, [
+        {"raw_word": raw_word, "product": product, "source": source, "updated_at": now}
+        for raw_word, product, source in mappings
+    ])
+
+
+def seed_corrections(conn=None, filepath="corrections.csv") -> int:
+    """
+    Seed product_corrections from corrections.csv and past restaurant_orders.
+    Later rows win, so the most recent correction for a word is kept.
+    Runs on `conn` (the migration's transaction) or in a transaction of its
+    own. Returns the number of mappings written.
+    """
+    if conn is None:
+        with get_database_engine().begin() as conn:
+            return seed_corrections(conn, filepath)
+
+    names = catalog.derived("name_set", _name_set)
+    lower_names = catalog.derived("lower_name_set", _lower_name_set)
+    mappings = {}
+
+    def add(raw_word, product, source):
+        key = correction_key(raw_word)
+        if key and product in names and key not in lower_names:
+            mappings[key] = (key, product, source)
+
+    if not os.path.isabs(filepath):
+        filepath = PROJECT_ROOT / filepath
+    if os.path.isfile(filepath):
+        with open(filepath, newline="") as f:
+            for row in csv.DictReader(f):
+                for raw_word, product in _CSV_CORRECTION.findall(row.get("corrections") or ""):
+                    add(raw_word, product, "csv")
+
+    try:
+        # Savepoint: a missing restaurant_orders table must not abort the caller's transaction
+        with conn.begin_nested():
+            rows = conn.execute(text("""
+                SELECT original_text, product
+                FROM restaurant_orders
+                WHERE original_text IS NOT NULL AND original_text != ''
+                    AND product IS NOT NULL AND product != ''
+                    AND position(chr(10) in original_text) = 0
+                ORDER BY date ASC, id ASC
+            """)).fetchall()
+        for original_text, product in rows:
+            add(original_text, product, "history")
+    except Exception as e:
+        logger.warning("⚠️  Could not read order history for correction seeding: %s", e)
+
+    if mappings:
+        _upsert(conn, list(mappings.values()))
+    logger.info("🌱 Seeded %s learned corrections", len(mappings))
+    return len(mappings)
+
+
+correction_cache = CorrectionCache()
+
+
+def lookup_correction(raw_word: str, count: bool = True) -> str | None:
+    return correction_cache.lookup(raw_word, count)
+
+
+def refresh_corrections():
+    """Reload the mappings if they are stale; a no-op while they are fresh."""
+    correction_cache.refresh()
+
+
+def learn_correction(raw_word: str, product: str, source: str = "operator") -> bool:
+    return correction_cache.learn(raw_word, product, source)
+
+
+def get_correction_stats() -> dict:
+    return correction_cache.stats()
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import QueuePool
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Log every SQL statement (slow, debugging only)
+SQL_ECHO = os.getenv("SQL_ECHO", "").lower() in ("1", "true", "yes")
+# Connections kept open per worker, and how many extra may be opened under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Seconds to wait for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 3600))
+# Per-statement limit in milliseconds (0 = no limit)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+# Set when DATABASE_URL points at PgBouncer in transaction pooling mode
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "").lower() in ("1", "true", "yes")
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def recreate(self):
+        # Keep the counters when SQLAlchemy swaps the pool (e.g. after a fork)
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.wait_total, pool.wait_max = self.wait_total, self.wait_max
+        return pool
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "size": self.size(),
+                "max_overflow": self._max_overflow,
+                "checked_out": self.checkedout(),
+                "idle": self.checkedin(),
+                "overflow": max(self.overflow(), 0),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 2)
+            }
+
+
+def database_url() -> str | URL:
+    """
+    DATABASE_URL (Railway's format) for the psycopg2 driver, or a URL built
+    from the individual DB_* variables used for local development.
+    """
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        return URL.create(
+            "postgresql+psycopg2",
+            username=os.getenv("DB_USER", "postgres"),
+            password=os.getenv("DB_PASSWORD"),
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", 5432)),
+            database=os.getenv("DB_NAME", "orderhub")
+        )
+    # Railway's DATABASE_URL might use postgres:// instead of postgresql://
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+psycopg2://", 1)
+    return url
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    The process-wide SQLAlchemy engine; every database access in the app
+    (src.db, src.saver and the modules built on them) checks out from its pool.
+    """
+    global _engine
+    if _engine is not None:
+        return _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = _create_engine()
+    return _engine
+
+
+def _create_engine():
+    connect_args = {"connect_timeout": 10}
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    engine = create_engine(
+        database_url(),
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,  # Verify connections before using them
+        connect_args=connect_args,
+        echo=SQL_ECHO
+    )
+
+    if DB_STATEMENT_TIMEOUT_MS and DB_PGBOUNCER:
+        # PgBouncer in transaction mode rejects startup options and hands the
+        # server connection to someone else after each transaction, so the
+        # limit is set per transaction: SET LOCAL opens the first transaction
+        # of every checkout, and SQLAlchemy-managed transactions get it again
+        # on begin.
+        @event.listens_for(engine.pool, "checkout")
+        def _timeout_on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with dbapi_connection.cursor() as cur:
+                cur.execute(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+        @event.listens_for(engine, "begin")
+        def _timeout_on_begin(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+    timeout = f"{DB_STATEMENT_TIMEOUT_MS}ms" if DB_STATEMENT_TIMEOUT_MS else "off"
+    logger.info(
+        "🗄️  Database pool: size=%s, max_overflow=%s, statement_timeout=%s, pgbouncer=%s",
+        DB_POOL_SIZE, DB_MAX_OVERFLOW, timeout, DB_PGBOUNCER
+    )
+    return engine
+
+
+def get_pool_stats() -> dict:
+    if _engine is None:
+        return {"started": False}
+    return {"started": True, **_engine.pool.stats()}
@@ -4,6 +4,9 @@ from collections import defaultdict
 from src.saver import get_database_engine
 import pandas as pd
 from sqlalchemy import text
+from src.logger import get_logger
+
+logger = get_logger(__name__)
 
 def get_order_history(filepath=None):
     """
@@ -11,9 +14,9 @@ def get_order_history(filepath=None):
     Returns a list of grouped orders.
     """
     try:
-        print("🔍 get_order_history() called - connecting to database...")
+        logger.debug("🔍 get_order_history() called - connecting to database...")
         engine = get_database_engine()
-        print("✅ Database engine obtained")
+        logger.debug("✅ Database engine obtained")
         
         # Query only orders (where product is not null)
         # Order by date DESC for groups, but by id ASC within same date to preserve original order
@@ -33,9 +36,9 @@ def get_order_history(filepath=None):
             ORDER BY date DESC, id ASC
         """
         
-        print("📊 Executing SQL query...")
+        logger.debug("📊 Executing SQL query...")
         df = pd.read_sql(query, engine)
-        print(f"✅ Query completed - got {len(df)} rows")
+        logger.debug("✅ Query completed - got %s rows", len(df))
         
         orders = []
         for _, row in df.iterrows():
@@ -98,11 +101,9 @@ def get_order_history(filepath=None):
                 "original_text": original_text
             })
         
-        print(f"✅ Processed {len(orders)} orders from database")
+        logger.debug("✅ Processed %s orders from database", len(orders))
     except Exception as e:
-        print(f"⚠️  Error loading order history from database: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("⚠️  Error loading order history from database: %s", e)
         return []
     
     # Group orders by restaurant_name and date
@@ -180,14 +181,14 @@ def get_order_history(filepath=None):
         return (dt, order.get("_sort_index", 0))
     
     # Sort by datetime (newest first), then by sort index (most recent first)
-    print(f"🔄 Sorting {len(result)} grouped orders...")
+    logger.debug("🔄 Sorting %s grouped orders...", len(result))
     result.sort(key=get_sort_key, reverse=True)
     
     # Remove the sort index before returning
     for order in result:
         order.pop("_sort_index", None)
     
-    print(f"✅ Returning {len(result)} grouped orders")
+    logger.debug("✅ Returning %s grouped orders", len(result))
     return result
 
 def get_messages(filepath=None):
@@ -294,9 +295,7 @@ def get_messages(filepath=None):
         
         return messages
     except Exception as e:
-        print(f"⚠️  Error loading messages from database: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("⚠️  Error loading messages from database: %s", e)
         return []
 
 def get_today_orders(filepath=None):
@@ -395,9 +394,7 @@ def get_today_orders(filepath=None):
                 "raw_message": raw_message
             })
     except Exception as e:
-        print(f"⚠️  Error loading today's orders from database: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("⚠️  Error loading today's orders from database: %s", e)
         return []
     
     # Group orders by restaurant_name
@@ -0,0 +1,515 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from src.logger import PROJECT_ROOT, get_logger
+
+logger = get_logger(__name__)
+
+# Fast-ack mode: the webhook stores the payload and returns, workers finish the order
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "").lower() in ("1", "true", "yes")
+INGEST_PATH = os.getenv("INGEST_PATH", str(PROJECT_ROOT / ".cache" / "ingest.sqlite3"))
+# Workers in the web process; 0 leaves the queue to `python -m src.ingest_worker` processes
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+# Delivery: a claimed message is leased for QUEUE_LEASE seconds; failed attempts
+# are retried with exponential backoff and dead-lettered after QUEUE_MAX_ATTEMPTS
+QUEUE_LEASE = float(os.getenv("QUEUE_LEASE", 120))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", 5))
+QUEUE_BACKOFF_BASE = float(os.getenv("QUEUE_BACKOFF_BASE", 5))
+QUEUE_BACKOFF_MAX = float(os.getenv("QUEUE_BACKOFF_MAX", 600))
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", 1.0))
+# Finished (done/dead) messages are kept this long for dedup and status lookups
+QUEUE_RETENTION_DAYS = float(os.getenv("QUEUE_RETENTION_DAYS", 7))
+QUEUE_PRUNE_INTERVAL = float(os.getenv("QUEUE_PRUNE_INTERVAL", 3600))
+
+# Manual submissions of the same text within this many seconds count as one
+MANUAL_DEDUP_WINDOW = float(os.getenv("MANUAL_DEDUP_WINDOW", 120))
+
+# Columns added after the first release of the table
+_QUEUE_COLUMNS = {
+    "sender": "TEXT",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "available_at": "REAL NOT NULL DEFAULT 0",
+    "lease_owner": "TEXT",
+    "lease_until": "REAL"
+}
+
+# Oldest claimable message with no earlier pending one from its sender.
+# "+m.rowid" keeps SQLite on the claim index instead of walking every
+# retained row in rowid order.
+_CLAIM_SQL = """
+    SELECT m.message_id, m.payload FROM inbound_messages m
+    WHERE ((m.status = 'queued' AND m.available_at <= ?)
+           OR (m.status = 'processing' AND m.lease_until < ?))
+      AND NOT EXISTS (
+          SELECT 1 FROM inbound_messages e
+          WHERE e.sender = m.sender AND e.status IN ('queued', 'processing') AND e.rowid < m.rowid
+      )
+    ORDER BY +m.rowid
+    LIMIT 1
+"""
+
+
+def message_key(payload: dict) -> str:
+    """
+    Idempotency key for an inbound message.
+
+    A client-supplied IdempotencyKey (form field or Idempotency-Key header)
+    wins. Twilio messages use their MessageSid, so webhook retries map to the
+    same key. Anything else, manual submissions included, gets a fresh id;
+    IngestStore.manual_key() swaps that for the id of a recent identical
+    manual submission.
+    """
+    if payload.get("IdempotencyKey"):
+        return "client-" + str(payload["IdempotencyKey"]).strip()[:200]
+    if payload.get("MessageSid"):
+        return payload["MessageSid"]
+    if payload.get("RestaurantName"):
+        return "manual-" + uuid.uuid4().hex
+    return uuid.uuid4().hex
+
+
+def manual_content(payload: dict) -> str | None:
+    """
+    Hash of restaurant + whitespace-normalised body for a manual submission
+    (RestaurantName, no MessageSid or client key); None for anything else.
+    """
+    if payload.get("IdempotencyKey") or payload.get("MessageSid") or not payload.get("RestaurantName"):
+        return None
+    content = payload["RestaurantName"].strip().lower() + "\n" + " ".join((payload.get("Body") or "").split())
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def sender_key(payload: dict) -> str | None:
+    """
+    Ordering key for an inbound message: messages with the same key are
+    processed one at a time, in arrival order (see IngestStore.claim).
+    """
+    if payload.get("RestaurantName"):
+        return "name:" + payload["RestaurantName"].strip().lower()
+    if payload.get("From"):
+        return "from:" + payload["From"].strip()
+    return None
+
+
+def replay(status: dict) -> dict:
+    """Response for a repeat of an already-seen message: the first result if there is one."""
+    if status["status"] == "done" and status["result"] is not None:
+        return {**status["result"], "duplicate": True}
+    return {
+        "status": "duplicate",
+        "message_id": status["message_id"],
+        "processing_status": status["status"],
+        "error": status["error"]
+    }
+
+
+class IngestStore:
+    """
+    Durable queue of inbound webhook payloads in a local SQLite (WAL) file.
+
+    The webhook writes every message here before anything else, so a crash or
+    a Postgres/OpenAI outage never loses it. Messages move
+    queued -> processing -> done, or back to queued with a backoff after a
+    failure, and to dead (copied into dead_letters) after QUEUE_MAX_ATTEMPTS.
+
+    A claim leases the message to one worker until `lease_until`; if that
+    worker dies, the lease expires and another worker picks the message up
+    again. Delivery is therefore at-least-once. Messages from one sender
+    (sender_key) are claimed strictly in arrival order: a later message waits
+    while an earlier one is queued, backing off or processing, across every
+    process sharing the file. The file can be shared by
+    several worker processes on the host.
+
+    Every method blocks on SQLite (up to its lock timeout when another
+    process holds the write lock), so async callers run them with
+    asyncio.to_thread().
+    """
+
+    def __init__(self, path: str = INGEST_PATH, lease: float = QUEUE_LEASE, max_attempts: int = QUEUE_MAX_ATTEMPTS):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.duplicates = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit; claims open their own BEGIN IMMEDIATE transaction
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS inbound_messages (
+                    message_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(inbound_messages)")}
+            for name, definition in _QUEUE_COLUMNS.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE inbound_messages ADD COLUMN {name} {definition}")
+            # Covers both claim branches: due queued rows and expired processing leases
+            conn.execute("DROP INDEX IF EXISTS inbound_messages_status")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS inbound_messages_claim ON inbound_messages (status, available_at, lease_until)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS inbound_messages_sender ON inbound_messages (sender, status)")
+            # First id given to each manual submission text, for MANUAL_DEDUP_WINDOW dedup
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS manual_submissions (
+                    content_hash TEXT NOT NULL,
+                    message_id TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS manual_submissions_content ON manual_submissions (content_hash, created_at)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    message_id TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    error TEXT,
+                    attempts INTEGER NOT NULL,
+                    failed_at REAL NOT NULL
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, message_id: str, payload: dict, owner: str = None) -> str | None:
+        """
+        Append a payload to the queue; returns its status, or None if the id
+        was seen before (the primary key is the dedup index).
+
+        With `owner`, the message is leased to that caller straight away
+        ("processing", for inline processing), unless an earlier message from
+        the same sender is still pending; then it is "queued" behind it.
+        """
+        conn = self._conn()
+        now = time.time()
+        sender = sender_key(payload)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if owner and not self._has_pending(conn, sender):
+                status, attempts, lease_owner, lease_until = "processing", 1, owner, now + self.lease
+            else:
+                status, attempts, lease_owner, lease_until = "queued", 0, None, None
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO inbound_messages "
+                "(message_id, payload, sender, status, created_at, updated_at, attempts, available_at, "
+                "lease_owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (message_id, json.dumps(payload), sender, status, now, now, attempts, now, lease_owner, lease_until)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if cursor.rowcount == 1:
+            return status
+        with self._lock:
+            self.duplicates += 1
+        return None
+
+    def manual_key(self, content_hash: str, message_id: str, window: float = MANUAL_DEDUP_WINDOW) -> str:
+        """
+        Id for a manual submission with this content hash (see manual_content):
+        the id of the same text submitted in the last `window` seconds if there
+        is one, otherwise `message_id`, which is recorded for later repeats.
+        The lookup and the record share one write transaction, so two
+        simultaneous double-submits resolve to the same id.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT message_id FROM manual_submissions WHERE content_hash = ? AND created_at >= ? "
+                "ORDER BY created_at LIMIT 1",
+                (content_hash, now - window)
+            ).fetchone()
+            if row is None:
+                conn.execute(
+                    "INSERT INTO manual_submissions (content_hash, message_id, created_at) VALUES (?, ?, ?)",
+                    (content_hash, message_id, now)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0] if row else message_id
+
+    @staticmethod
+    def _has_pending(conn, sender: str | None) -> bool:
+        if sender is None:
+            return False
+        return conn.execute(
+            "SELECT 1 FROM inbound_messages WHERE sender = ? AND status IN ('queued', 'processing') LIMIT 1",
+            (sender,)
+        ).fetchone() is not None
+
+    def claim(self, owner: str) -> tuple[str, dict] | None:
+        """
+        Lease the oldest due message (or one whose lease expired) to `owner`,
+        skipping messages queued behind an earlier one from the same sender.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(_CLAIM_SQL, (now, now)).fetchone()
+            if row:
+                conn.execute("""
+                    UPDATE inbound_messages
+                    SET status = 'processing', attempts = attempts + 1,
+                        lease_owner = ?, lease_until = ?, updated_at = ?
+                    WHERE message_id = ?
+                """, (owner, now + self.lease, now, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return (row[0], json.loads(row[1])) if row else None
+
+    def extend(self, message_id: str, owner: str) -> bool:
+        """Renew `owner`'s lease for another `lease` seconds; False if it was lost meanwhile."""
+        now = time.time()
+        cursor = self._conn().execute("""
+            UPDATE inbound_messages SET lease_until = ?, updated_at = ?
+            WHERE message_id = ? AND lease_owner = ? AND status = 'processing'
+        """, (now + self.lease, now, message_id, owner))
+        return cursor.rowcount == 1
+
+    def complete(self, message_id: str, owner: str, result: dict):
+        self._conn().execute("""
+            UPDATE inbound_messages
+            SET status = 'done', result = ?, error = NULL, lease_owner = NULL, lease_until = NULL, updated_at = ?
+            WHERE message_id = ? AND lease_owner = ?
+        """, (json.dumps(result, default=str), time.time(), message_id, owner))
+
+    def fail(self, message_id: str, owner: str, error: str) -> str:
+        """Record a failed attempt; returns the new status ('queued' for a retry, or 'dead')."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT payload, attempts FROM inbound_messages WHERE message_id = ? AND lease_owner = ?",
+                (message_id, owner)
+            ).fetchone()
+            if not row:
+                # Lease expired and another worker owns the message now
+                conn.execute("COMMIT")
+                return "processing"
+
+            payload, attempts = row
+            if attempts >= self.max_attempts:
+                status = "dead"
+                conn.execute(
+                    "INSERT OR REPLACE INTO dead_letters (message_id, payload, error, attempts, failed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (message_id, payload, error, attempts, now)
+                )
+                available_at = now
+            else:
+                status = "queued"
+                # Exponential backoff with full jitter
+                available_at = now + random.uniform(0, min(QUEUE_BACKOFF_MAX, QUEUE_BACKOFF_BASE * 2 ** (attempts - 1)))
+            conn.execute("""
+                UPDATE inbound_messages
+                SET status = ?, error = ?, available_at = ?, lease_owner = NULL, lease_until = NULL, updated_at = ?
+                WHERE message_id = ?
+            """, (status, error, available_at, now, message_id))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return status
+
+    def status(self, message_id: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT status, result, error, attempts, created_at, updated_at FROM inbound_messages WHERE message_id = ?",
+            (message_id,)
+        ).fetchone()
+        if not row:
+            return None
+        status, result, error, attempts, created_at, updated_at = row
+        return {
+            "message_id": message_id,
+            "status": status,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def prune(self, retention_days: float = QUEUE_RETENTION_DAYS) -> int:
+        """
+        Delete done and dead messages last updated more than `retention_days`
+        ago; returns how many went. Their ids are then no longer deduplicated.
+        Dead letters are kept for inspection.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM manual_submissions WHERE created_at < ?", (now - MANUAL_DEDUP_WINDOW,))
+        cursor = conn.execute(
+            "DELETE FROM inbound_messages WHERE status IN ('done', 'dead') AND updated_at < ?",
+            (now - retention_days * 86400,)
+        )
+        return cursor.rowcount
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM inbound_messages GROUP BY status").fetchall()
+        return dict(rows)
+
+
+class IngestWorkers:
+    """
+    A pool of asyncio workers draining the ingest queue with
+    `handler(message_id, payload)`.
+
+    Workers poll the queue, so messages enqueued by other processes, retries
+    whose backoff elapsed and expired leases are all picked up; submit()
+    wakes them early for a fresh message. A background task prunes finished
+    messages every QUEUE_PRUNE_INTERVAL seconds.
+
+    Blocking stages run in threads, but the workers still share the web
+    process; set INGEST_WORKERS=0 and run `python -m src.ingest_worker` to process
+    the queue in separate processes instead.
+    """
+
+    def __init__(self, store: IngestStore, workers: int = INGEST_WORKERS):
+        self.store = store
+        self.workers = workers
+        self.handler = None
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = None
+        self._tasks = []
+
+    async def start(self, handler):
+        self.handler = handler
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._prune()))
+        logger.info("📥 Ingest workers started: %s (%s)", self.workers, self.owner)
+
+    async def wait(self):
+        """Block until the started workers stop; for processes that only drain the queue."""
+        await asyncio.gather(*self._tasks)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _prune(self):
+        while True:
+            try:
+                pruned = await asyncio.to_thread(self.store.prune)
+                if pruned:
+                    logger.info("🧹 Pruned %s finished message(s) from the ingest queue", pruned)
+            except sqlite3.Error as e:
+                logger.warning("⚠️  Could not prune the ingest queue: %s", e)
+            await asyncio.sleep(QUEUE_PRUNE_INTERVAL)
+
+    def submit(self, message_id: str):
+        if self._wakeup:
+            self._wakeup.set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def process(self, message_id: str, payload: dict, owner: str = None, **context) -> dict:
+        """
+        Run the handler for a leased message and record the outcome; re-raises
+        on failure. The lease is renewed every third of its length while the
+        handler runs, so a slow message is not handed to a second worker.
+        Keyword arguments in `context` are passed on to the handler.
+        """
+        owner = owner or self.owner
+        try:
+            result = await self._run_leased(message_id, payload, owner, context)
+        except asyncio.CancelledError:
+            # Shutting down: the lease expires and the message is retried
+            raise
+        except Exception as e:
+            status = await asyncio.to_thread(self.store.fail, message_id, owner, str(e))
+            logger.exception("❌ Processing message %s failed (%s): %s", message_id, status, e)
+            raise
+        await asyncio.to_thread(self.store.complete, message_id, owner, result)
+        return result
+
+    async def _run_leased(self, message_id: str, payload: dict, owner: str, context: dict) -> dict:
+        heartbeat = asyncio.create_task(self._keep_leased(message_id, owner))
+        try:
+            return await self.handler(message_id, payload, **context)
+        finally:
+            heartbeat.cancel()
+
+    async def _keep_leased(self, message_id: str, owner: str):
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            try:
+                if not await asyncio.to_thread(self.store.extend, message_id, owner):
+                    logger.warning("⚠️  Lost the lease on message %s", message_id)
+                    return
+            except sqlite3.Error as e:
+                logger.warning("⚠️  Could not extend the lease on message %s: %s", message_id, e)
+
+    async def _work(self):
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self.store.claim, self.owner)
+            except sqlite3.Error as e:
+                logger.warning("⚠️  Ingest queue unavailable: %s", e)
+                claimed = None
+
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self.process(*claimed)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass  # already logged and recorded by process()
+
+    def stats(self) -> dict:
+        try:
+            counts = self.store.counts()
+        except sqlite3.Error:
+            counts = None
+        return {
+            "async_ack": WEBHOOK_ASYNC,
+            "workers": self.workers if self._tasks else 0,
+            "messages": counts,
+            "duplicates": self.store.duplicates
+        }
+
+
+ingest_store = IngestStore()
+ingest_workers = IngestWorkers(ingest_store)
+
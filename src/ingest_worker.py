@@ -0,0 +1,30 @@
+"""
+Standalone ingest worker: `python -m src.ingest_worker`.
+
+Drains the shared ingest queue outside the web process (run the web app with
+INGEST_WORKERS=0), with the web app's startup and shutdown steps.
+"""
+import asyncio
+
+from src.ai.client import close_async_client
+from src.alerts import alert_dispatcher
+from src.ingest import ingest_workers
+from src.main import process_inbound
+from src.migrations import run_migrations
+
+
+async def main():
+    # No health check to report a failure on here: exit instead of running without the schema
+    await asyncio.to_thread(run_migrations)
+    alert_dispatcher.start()
+    await ingest_workers.start(process_inbound)
+    try:
+        await ingest_workers.wait()
+    finally:
+        await ingest_workers.stop()
+        await close_async_client()
+        await asyncio.to_thread(alert_dispatcher.flush, 10)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
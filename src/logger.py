@@ -1,7 +1,17 @@
+import atexit
 import csv
+import json
+import logging
+import logging.handlers
 import os
+import queue
+import random
+import sys
+import threading
 from pathlib import Path
 from datetime import datetime
+from dotenv import load_dotenv
+load_dotenv()
 
 # Get the project root directory (parent of src/)
 PROJECT_ROOT = Path(__file__).parent.parent.resolve()
@@ -29,3 +39,86 @@ def log_correction(restaurant: str, raw_message: str, corrections: list[str], fi
             "; ".join(corrections)
         ])
 
+
+# Application logging: LOG_LEVEL (DEBUG/INFO/WARNING/ERROR), LOG_FORMAT ("text"
+# or "json" for one JSON object per line) and the share of DEBUG records kept.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", 1.0))
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class DebugSampler(logging.Filter):
+    """Keep every INFO+ record and a random `rate` share of DEBUG records."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Same-process queue: the record (args, exc_info) can be handed over as is
+        return record
+
+
+def configure_logging():
+    """
+    Route the `src` loggers through a queue to a background writer thread,
+    so request threads only enqueue records. Safe to call more than once.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        stream = logging.StreamHandler(sys.stdout)
+        if LOG_FORMAT == "json":
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+
+        log_queue = queue.SimpleQueue()
+        handler = _DeferredQueueHandler(log_queue)
+        handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+
+        app_logger = logging.getLogger("src")
+        app_logger.setLevel(LOG_LEVEL)
+        app_logger.addHandler(handler)
+        app_logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger for a module (pass __name__), writing through the background queue.
+
+    Pass values as %-style arguments (logger.info("Saved %s lines", n)), not
+    f-strings: a record below LOG_LEVEL is then never formatted, and a kept
+    one is formatted on the writer thread.
+    """
+    configure_logging()
+    return logging.getLogger(name)
@@ -1,23 +1,35 @@
-from src.parser import parser_order
-from src.utils.special_cases import apply_special_cases
-from src.validator import validate_order
-from src.saver import save_order, save_message, save_to_conversations, save_checked_order
-from src.input_tool import input_text_tool
-from src.db import get_products, get_restaurant_by_name, get_restaurant_by_phone
-from src.alerts import send_manager_alert
-from src.ai.order_parser import ai_parse_order, normalize_order
-from src.ai.conversational_agent import conversational_agent, get_welcome_message
+from src.budget import LatencyBudget
+from src.pipeline import process_order, get_pipeline_stats, warm_caches
+from src.alerts import alert_dispatcher, get_alert_stats
+from src.migrations import run_migrations, migration_status
+from src.scheduler import lane_scheduler, get_scheduler_stats
+from src.database import get_pool_stats
+from src.ingest import WEBHOOK_ASYNC, ingest_store, ingest_workers, manual_content, message_key, replay
+from src.saver import save_message, save_to_conversations
+from src.db import (get_products, get_restaurant_by_name, get_restaurant_by_phone,
+                    invalidate_restaurants, get_restaurant_stats)
+from src.catalog import catalog
+from src.correction_cache import learn_correction, get_correction_stats
+from src.ai.conversational_agent import conversational_agent_async, get_welcome_message, get_classifier_stats
+from src.ai.cache import get_ai_cache_stats
+from src.ai.client import close_async_client
 from src.history import get_order_history, get_today_orders, get_messages
 from src.conversations import get_all_conversations
 from fastapi import FastAPI, Request, Query
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from datetime import datetime
+import asyncio
 import os
+import uuid
+from src.logger import get_logger
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 app = FastAPI()
 
@@ -36,7 +48,7 @@ allowed_origins = [
 if frontend_url not in allowed_origins:
     allowed_origins.append(frontend_url)
 
-print(f"🌐 CORS allowed origins: {allowed_origins}")
+logger.info("🌐 CORS allowed origins: %s", allowed_origins)
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,24 +61,26 @@ app.add_middleware(
 
 @app.get("/")
 def health_check():
-    return {"status": "ok"}
+    # Failed migrations leave the save path without its tables: report unhealthy
+    migrations = migration_status()
+    if migrations["state"] == "error":
+        return JSONResponse(status_code=503, content={"status": "degraded", "migrations": migrations})
+    return {"status": "ok", "migrations": migrations["state"]}
 
 @app.get("/history")
 def get_history():
     """Get order history grouped by restaurant and date"""
     try:
-        print("📡 /history endpoint called")
+        logger.debug("📡 /history endpoint called")
         orders = get_order_history()
-        print(f"✅ Found {len(orders)} orders")
+        logger.debug("✅ Found %s orders", len(orders))
         if orders:
-            print(f"   First order: {orders[0].get('restaurant_name')} - {len(orders[0].get('items', []))} items")
+            logger.debug("   First order: %s - %s items", orders[0].get('restaurant_name'), len(orders[0].get('items', [])))
         response_data = {"orders": orders}
-        print(f"📤 Returning {len(orders)} orders to frontend")
+        logger.debug("📤 Returning %s orders to frontend", len(orders))
         return response_data
     except Exception as e:
-        print(f"❌ Error loading history: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Error loading history: %s", e)
         return {"orders": [], "error": str(e)}
 
 @app.get("/feed")
@@ -76,9 +90,7 @@ def get_feed():
         orders = get_today_orders()
         return {"orders": orders, "date": datetime.now().strftime("%d/%m/%Y")}
     except Exception as e:
-        print(f"Error loading feed: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error loading feed: %s", e)
         return {"orders": [], "error": str(e), "date": datetime.now().strftime("%d/%m/%Y")}
 
 @app.get("/messages")
@@ -88,9 +100,7 @@ def get_messages_endpoint():
         messages = get_messages()
         return {"messages": messages, "count": len(messages)}
     except Exception as e:
-        print(f"Error loading messages: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error loading messages: %s", e)
         return {"messages": [], "count": 0, "error": str(e)}
 
 @app.get("/conversations")
@@ -100,9 +110,7 @@ def get_conversations_endpoint():
         conversations = get_all_conversations()
         return {"conversations": conversations, "count": len(conversations)}
     except Exception as e:
-        print(f"Error loading conversations: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error loading conversations: %s", e)
         return {"conversations": [], "count": 0, "error": str(e)}
 
 class ReplyRequest(BaseModel):
@@ -124,11 +132,11 @@ def reply_to_message(reply_request: ReplyRequest):
         from sqlalchemy import text
         
         # Debug logging
-        print(f"📩 Received reply request:")
-        print(f"   Message ID: {reply_request.message_id}")
-        print(f"   Reply Text: {reply_request.reply_text}")
-        print(f"   Restaurant: {reply_request.restaurant_name}")
-        print(f"   Restaurant ID: {reply_request.restaurant_id}")
+        logger.info("📩 Received reply request:")
+        logger.debug("   Message ID: %s", reply_request.message_id)
+        logger.debug("   Reply Text: %s", reply_request.reply_text)
+        logger.debug("   Restaurant: %s", reply_request.restaurant_name)
+        logger.debug("   Restaurant ID: %s", reply_request.restaurant_id)
         
         engine = get_database_engine()
         
@@ -174,11 +182,11 @@ def reply_to_message(reply_request: ReplyRequest):
             row = result.fetchone()
             if row:
                 parent_conversation_id = row[0]
-                print(f"✅ Found existing conversations entry with ID: {parent_conversation_id}")
+                logger.info("✅ Found existing conversations entry with ID: %s", parent_conversation_id)
         
         # If no conversations entry exists for the original message, create one
         if parent_conversation_id is None:
-            print(f"📝 Creating conversations entry for original message...")
+            logger.info("📝 Creating conversations entry for original message...")
             try:
                 save_to_conversations(
                     message=original_message,
@@ -196,9 +204,9 @@ def reply_to_message(reply_request: ReplyRequest):
                     row = result.fetchone()
                     if row:
                         parent_conversation_id = row[0]
-                        print(f"✅ Created and found conversations entry with ID: {parent_conversation_id}")
+                        logger.info("✅ Created and found conversations entry with ID: %s", parent_conversation_id)
             except Exception as create_error:
-                print(f"⚠️  Warning: Could not create conversations entry for original message: {create_error}")
+                logger.warning("⚠️  Warning: Could not create conversations entry for original message: %s", create_error)
                 # Continue anyway, we'll save the reply without a parent
         
         # Save reply to conversations table with parent_message_id pointing to conversations table
@@ -210,11 +218,9 @@ def reply_to_message(reply_request: ReplyRequest):
                 direction="outgoing",
                 parent_message_id=parent_conversation_id  # Use conversations.id as parent reference
             )
-            print(f"✅ Successfully saved reply to conversations table with parent_message_id={parent_conversation_id}")
+            logger.info("✅ Successfully saved reply to conversations table with parent_message_id=%s", parent_conversation_id)
         except Exception as save_error:
-            print(f"❌ Failed to save to conversations table: {save_error}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ Failed to save to conversations table: %s", save_error)
             # Still continue to update need_attention, but return an error status
             return {
                 "status": "error",
@@ -242,13 +248,13 @@ def reply_to_message(reply_request: ReplyRequest):
             
             if saved_row:
                 saved_message = saved_row[0]
-                print(f"✅ Verified saved message: {saved_message[:100]}{'...' if len(saved_message) > 100 else ''}")
+                logger.info("✅ Verified saved message: %.100s", saved_message)
                 if saved_message != reply_request.reply_text:
-                    print(f"⚠️  WARNING: Saved message doesn't match sent message!")
-                    print(f"   Sent: {reply_request.reply_text[:100]}")
-                    print(f"   Saved: {saved_message[:100]}")
+                    logger.warning("⚠️  WARNING: Saved message doesn't match sent message!")
+                    logger.warning("   Sent: %.100s", reply_request.reply_text)
+                    logger.warning("   Saved: %.100s", saved_message)
             else:
-                print(f"⚠️  WARNING: Could not verify saved message - query returned no results")
+                logger.warning("⚠️  WARNING: Could not verify saved message - query returned no results")
         
         # Update need_attention flag to False in restaurant_orders table
         query = text("""
@@ -275,9 +281,7 @@ def reply_to_message(reply_request: ReplyRequest):
             }
     
     except Exception as e:
-        print(f"Error replying to message: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error replying to message: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.delete("/order/group")
@@ -313,9 +317,7 @@ def delete_order_group(restaurant_name: str, date: str):
         else:
             return {"status": "not_found", "message": f"No orders found for {restaurant_name} on {date}"}
     except Exception as e:
-        print(f"Error deleting order group: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error deleting order group: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.put("/order/{order_id}")
@@ -355,20 +357,26 @@ def update_order_item(
             return {"status": "error", "message": "No fields provided for update"}
         
         # Build and execute update query
-        query = text(f"UPDATE restaurant_orders SET {', '.join(updates)} WHERE id = :order_id")
+        query = text(f"UPDATE restaurant_orders SET {', '.join(updates)} WHERE id = :order_id RETURNING original_text")
         
         with engine.connect() as conn:
             result = conn.execute(query, params)
+            row = result.fetchone()
             conn.commit()
             
-        if result.rowcount > 0:
+        if row:
+            # Remember the operator's product choice for this raw word
+            original_text = row[0]
+            if params.get("product") and original_text:
+                try:
+                    learn_correction(original_text, params["product"])
+                except Exception as learn_error:
+                    logger.warning("⚠️  Could not learn correction for order item %s: %s", order_id, learn_error)
             return {"status": "updated", "message": f"Order item {order_id} updated successfully"}
         else:
             return {"status": "not_found", "message": f"Order item {order_id} not found"}
     except Exception as e:
-        print(f"Error updating order item: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating order item: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.delete("/order/{order_id}")
@@ -391,11 +399,40 @@ def delete_order_item(order_id: int):
         else:
             return {"status": "not_found", "message": f"Order item {order_id} not found"}
     except Exception as e:
-        print(f"Error deleting order item: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error deleting order item: %s", e)
         return {"status": "error", "message": str(e)}
 
+@app.post("/products/reload")
+def reload_products():
+    """Force the in-memory product catalog to re-read the products table"""
+    try:
+        products = catalog.reload()
+        return {"status": "reloaded", "count": len(products), "version": catalog.version}
+    except Exception as e:
+        logger.exception("Error reloading products: %s", e)
+        return {"status": "error", "message": str(e)}
+
+@app.post("/restaurants/reload")
+def reload_restaurants():
+    """Drop the cached restaurant/phone directory so the next message re-reads it"""
+    invalidate_restaurants()
+    return {"status": "invalidated"}
+
+@app.get("/stats")
+def get_stats():
+    """Get in-process cache and matcher counters"""
+    return {
+        "corrections": get_correction_stats(),
+        "ai_cache": get_ai_cache_stats(),
+        "classifier": get_classifier_stats(),
+        "pipeline": get_pipeline_stats(),
+        "ingest": ingest_workers.stats(),
+        "alerts": get_alert_stats(),
+        "restaurants": get_restaurant_stats(),
+        "lanes": get_scheduler_stats(),
+        "db_pool": get_pool_stats()
+    }
+
 @app.get("/welcome/{restaurant_name}")
 def get_welcome(restaurant_name: str):
     """Get welcome message for a restaurant"""
@@ -442,9 +479,7 @@ def mark_order_checked(restaurant_name: str = Query(...), order_date: str = Quer
         return {"status": "checked", "message": f"Order marked as checked"}
     
     except Exception as e:
-        print(f"Error marking order as checked: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error marking order as checked: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.post("/orders/uncheck")
@@ -480,9 +515,7 @@ def mark_order_unchecked(restaurant_name: str = Query(...), order_date: str = Qu
         return {"status": "unchecked", "message": f"Order marked as unchecked"}
     
     except Exception as e:
-        print(f"Error marking order as unchecked: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error marking order as unchecked: %s", e)
         return {"status": "error", "message": str(e)}
 
 @app.get("/orders/checked")
@@ -514,9 +547,7 @@ def get_checked_orders():
         return {"checked_orders": checked_orders}
     
     except Exception as e:
-        print(f"Error getting checked orders: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting checked orders: %s", e)
         return {"checked_orders": [], "error": str(e)}
 
 @app.get("/whatsapp")
@@ -528,42 +559,140 @@ async def whatsapp_options():
     """Handle CORS preflight requests"""
     return {"status": "ok"}
 
+@app.on_event("startup")
+def migrate_database():
+    # Create/upgrade tables and indexes once, so the save path needn't check
+    try:
+        run_migrations()
+    except Exception as e:
+        logger.exception("❌ Database migrations failed: %s", e)
+
+@app.on_event("startup")
+async def start_ingest_workers():
+    # Workers always run: they drain retries and messages left over by a restart
+    await ingest_workers.start(process_inbound)
+
+@app.on_event("startup")
+def start_alert_dispatcher():
+    alert_dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_ingest_workers():
+    await ingest_workers.stop()
+    # Nothing on this loop calls OpenAI any more: release the client's connections
+    await close_async_client()
+
+@app.on_event("shutdown")
+def flush_alerts():
+    # Give queued manager alerts a chance to go out before the process exits
+    if not alert_dispatcher.flush(timeout=10):
+        logger.warning("⚠️  Manager alerts still queued at shutdown")
+
 @app.post("/whatsapp")
 async def whatsapp_webhook(request: Request):
+    # ⏱️ The latency budget runs from arrival, so parsing, dedup and the lane wait count against it
+    budget = LatencyBudget()
     form = await request.form()
-    sender = form.get("From")
-    body = form.get("Body")
-    restaurant_name_input = form.get("RestaurantName")
+    payload = {
+        "From": form.get("From"),
+        "Body": form.get("Body"),
+        "RestaurantName": form.get("RestaurantName"),
+        "MessageSid": form.get("MessageSid"),
+        "IdempotencyKey": form.get("IdempotencyKey") or request.headers.get("Idempotency-Key")
+    }
+
+    # 📥 Persist the message before doing anything else, so a failure below
+    # leaves it queued for a retry instead of losing it
+    message_id = message_key(payload)
+    content_hash = manual_content(payload)
+    if content_hash:
+        # A double-submitted form reuses the first submission's id
+        message_id = await asyncio.to_thread(ingest_store.manual_key, content_hash, message_id)
+
+    # ⚡ Fast ack: the workers do the rest. Otherwise the message is processed
+    # inline, unless an earlier one from the same sender is still pending
+    owner = None if WEBHOOK_ASYNC else f"webhook-{uuid.uuid4().hex[:8]}"
+    status = await asyncio.to_thread(ingest_store.enqueue, message_id, payload, owner)
+    if status == "processing":
+        return await ingest_workers.process(message_id, payload, owner, budget=budget)
+    if status == "queued":
+        ingest_workers.submit(message_id)
+        return {
+            "status": "accepted",
+            "message_id": message_id,
+            "status_url": f"/whatsapp/status/{message_id}",
+            "duplicate": False
+        }
+
+    # 🔁 Seen before (Twilio retry or double submit): no AI calls, no DB writes
+    logger.info("🔁 Duplicate message %s, returning the first result", message_id)
+    return replay(await asyncio.to_thread(ingest_store.status, message_id))
+
+@app.get("/whatsapp/status/{message_id}")
+def whatsapp_status(message_id: str):
+    """Queue state of an inbound message, with the usual webhook response once done"""
+    status = ingest_store.status(message_id)
+    if status is None:
+        return {"status": "not_found", "message_id": message_id}
+    return status
+
+async def process_inbound(message_id: str, payload: dict, budget: LatencyBudget = None) -> dict:
+    """
+    Classify, parse, match and save one inbound message; returns the webhook
+    response. Without a `budget` (messages claimed by the queue workers), the
+    latency budget starts now.
+    """
+    budget = budget or LatencyBudget()
+    sender = payload.get("From")
+    body = payload.get("Body")
+    restaurant_name_input = payload.get("RestaurantName")
 
     # 🔑 Lookup restaurant by name if provided, otherwise by phone
     phone_number = ""
     if restaurant_name_input:
-        restaurant = get_restaurant_by_name(restaurant_name_input)
+        restaurant = await asyncio.to_thread(get_restaurant_by_name, restaurant_name_input)
         if restaurant:
             restaurant_id, restaurant_name = restaurant
         else:
             restaurant_id, restaurant_name = None, restaurant_name_input
     else:
         phone_number = sender.replace("whatsapp:", "") if sender else ""
-        restaurant = get_restaurant_by_phone(phone_number)
+        restaurant = await asyncio.to_thread(get_restaurant_by_phone, phone_number)
         if restaurant:
             restaurant_id, restaurant_name = restaurant
         else:
             restaurant_id, restaurant_name = None, "Unknown"
 
     sender_info = restaurant_name_input if restaurant_name_input else (phone_number or sender or "Manual")
-    print(f"📩 Message from {sender_info} -> {restaurant_name}: {body}")
+    logger.info("📩 Message from %s -> %s: %s", sender_info, restaurant_name, body)
+
+    # 🚦 In this process, one restaurant's messages are processed one at a time, in arrival order;
+    # different restaurants run in parallel
+    lane_key = restaurant_id if restaurant_id is not None else (restaurant_name_input or phone_number or restaurant_name)
+    return await lane_scheduler.run(
+        lane_key, lambda: process_restaurant_message(body, restaurant_id, restaurant_name, message_id, budget)
+    )
+
+async def process_restaurant_message(
+    body: str, restaurant_id, restaurant_name: str, message_id: str = None, budget: LatencyBudget = None
+) -> dict:
+    # ⏱️ AI tiers are skipped once this message's latency budget runs low
+    budget = budget or LatencyBudget()
+    # The local classifier reads the catalog; refresh it off the event loop
+    await asyncio.to_thread(warm_caches)
 
     # 🤖 STEP 0: Pass through conversational agent to classify message
-    agent_result = conversational_agent(body, restaurant_name)
+    agent_result = await conversational_agent_async(body, restaurant_name, budget)
     
     # If it's a natural message (not an order), handle differently
     if agent_result["type"] == "message":
-        print(f"💬 Natural message detected from {restaurant_name}: {body}")
+        logger.info("💬 Natural message detected from %s: %s", restaurant_name, body)
         
         # Save the message to restaurant_orders and conversations tables
-        save_result = save_message(body, restaurant_id, restaurant_name)
-        print(f"✅ Message saved: {save_result}")
+        save_result = await asyncio.to_thread(
+            save_message, body, restaurant_id, restaurant_name, message_id=message_id
+        )
+        logger.info("✅ Message saved: %s", save_result)
         
         return {
             "status": "message_received",
@@ -574,149 +703,25 @@ async def whatsapp_webhook(request: Request):
             "display_alert": f"Message from {restaurant_name}: {body}"
         }
     
-    # Otherwise, it's an order - save full message to conversations first, then process
-    print(f"📦 Order detected from {restaurant_name}")
-    
-    # Save the full order message to conversations table (before processing into line items)
-    save_to_conversations(body, restaurant_id, restaurant_name, direction="incoming")
-    results = []
-    saved_count = 0  # Track how many orders we successfully save
+    # Otherwise, it's an order
+    logger.info("📦 Order detected from %s", restaurant_name)
 
-    # --- Step 1: AI-based unstructured parsing ---
-    if "add" in body.lower() or "remove" in body.lower():
-        try:
-            parsed_items = ai_parse_order(body)
-        except ValueError as e:
-            # OpenAI not available, fall back to regular parsing
-            print(f"⚠️  AI parsing unavailable: {e}. Falling back to regular parsing.")
-            parsed_items = []
-            # Continue with regular parsing flow below
-        
-        if parsed_items:
-            for parsed in parsed_items:
-                if parsed["action"] == "remove":
-                    send_manager_alert(
-                        restaurant=restaurant_name,
-                        raw_message=body,
-                        errors=["REMOVE request detected — manual handling required"]
-                    )
-                    results.append({"status": "red_alert", "item": parsed})
-                else:
-                    validated = validate_order({
-                        "parsed": parsed,  # ✅ AI extracted fields
-                        "extras": {
-                            "raw_input": parsed.get("product", ""),  # ✅ raw guess from AI
-                            "raw_matches": [parsed.get("product", "")]
-                        }
-                    })
-                    validated["raw_message"] = body  # Store original message
-                    saved = save_order(validated, restaurant_id, restaurant_name)
-                    # Add parsed info to result
-                    if saved.get("status") == "saved":
-                        saved["parsed"] = validated.get("validated")
-                        saved["original_input"] = parsed
-                        saved_count += 1
-                    results.append(saved)
-        
-        # If no AI parsing results, fall through to regular parsing
-        if not parsed_items:
-            normalize_body, line_mapping = normalize_order(body)
-            incoming = input_text_tool(normalize_body, restaurant_name)
-
-            for normalized_line in incoming["orders"]:
-                # Get the original line before normalization
-                # Normalized lines are already stripped by input_text_tool, so strip for lookup
-                normalized_line_stripped = normalized_line.strip()
-                original_line = line_mapping.get(normalized_line_stripped, normalized_line_stripped)
-                
-                parsed = parser_order(normalized_line_stripped)
-
-                special = apply_special_cases(parsed["parsed"]["product"])
-                if special:
-                    parsed["parsed"]["product"] = special
-                validated = validate_order(parsed)
-                validated["raw_message"] = original_line  # Save original line, not normalized
-
-                if validated.get("action") == "red_alert":
-                    send_manager_alert(
-                        restaurant=restaurant_name,
-                        raw_message=original_line,  # Use original line
-                        errors=validated.get("red_alerts", [])
-                    )
-                    # Still save the order even with red alert
-                    saved = save_order(validated, restaurant_id, restaurant_name)
-                    # Add parsed info to result
-                    if saved.get("status") == "saved":
-                        saved["parsed"] = validated.get("validated")
-                        saved["original_parsed"] = parsed.get("parsed")
-                        saved_count += 1
-                    saved["raw_message"] = original_line  # Use original line
-                    saved["red_alerts"] = validated.get("red_alerts", [])
-                    results.append(saved)
-                else:
-                    saved = save_order(validated, restaurant_id, restaurant_name)
-                    # Add parsed info to result
-                    if saved.get("status") == "saved":
-                        saved["parsed"] = validated.get("validated")
-                        saved["original_parsed"] = parsed.get("parsed")
-                        saved_count += 1
-                    saved["raw_message"] = original_line  # Use original line
-                    results.append(saved)
-    else:
-        normalize_body, line_mapping = normalize_order(body)
-        incoming = input_text_tool(normalize_body, restaurant_name)
-
-        for normalized_line in incoming["orders"]:
-            # Get the original line before normalization
-            # Normalized lines are already stripped by input_text_tool, so strip for lookup
-            normalized_line_stripped = normalized_line.strip()
-            original_line = line_mapping.get(normalized_line_stripped, normalized_line_stripped)
-            
-            parsed = parser_order(normalized_line_stripped)
-
-            special = apply_special_cases(parsed["parsed"]["product"])
-            if special:
-                parsed["parsed"]["product"] = special
-            validated = validate_order(parsed)
-            validated["raw_message"] = original_line  # Save original line, not normalized
-
-            if validated.get("action") == "red_alert":
-                send_manager_alert(
-                    restaurant=restaurant_name,
-                    raw_message=original_line,  # Use original line
-                    errors=validated.get("red_alerts", [])
-                )
-                # Still save the order even with red alert
-                saved = save_order(validated, restaurant_id, restaurant_name)
-                # Add parsed info to result
-                if saved.get("status") == "saved":
-                    saved["parsed"] = validated.get("validated")
-                    saved["original_parsed"] = parsed.get("parsed")
-                    saved_count += 1
-                saved["raw_message"] = original_line  # Use original line
-                saved["red_alerts"] = validated.get("red_alerts", [])
-                results.append(saved)
-            else:
-                saved = save_order(validated, restaurant_id, restaurant_name)
-                # Add parsed info to result
-                if saved.get("status") == "saved":
-                    saved["parsed"] = validated.get("validated")
-                    saved["original_parsed"] = parsed.get("parsed")
-                    saved_count += 1
-                saved["raw_message"] = original_line  # Use original line
-                results.append(saved)
-
-    # --- Step 3: Save grouped order to checked_orders table
-    # Save to checked_orders if we saved any orders
-    if saved_count > 0:
-        save_checked_order(restaurant_name, amount_of_products=saved_count)
+    # Record the full message first, keyed by message_id so a retry adds no second row;
+    # if this fails the queue retries the message before any line is saved
+    await asyncio.to_thread(
+        save_to_conversations, body, restaurant_id, restaurant_name, direction="incoming", message_id=message_id
+    )
+
+    # --- Steps 1-3: parse, match, validate and save every line of the message in one transaction
+    processed = await process_order(body, restaurant_id, restaurant_name, budget, message_id=message_id)
 
     # --- Step 4: return summary with original message
     return {
         "status": "processed", 
-        "orders": results,
+        "orders": processed["orders"],
         "original_message": body,
-        "restaurant_name": restaurant_name
+        "restaurant_name": restaurant_name,
+        "latency": {**budget.summary(), "stages": processed["timings"]}
     }
 
 
@@ -0,0 +1,157 @@
+from sqlalchemy import text
+
+from src.catalog import catalog
+from src.correction_cache import seed_corrections
+from src.logger import get_logger
+from src.saver import get_database_engine
+
+logger = get_logger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock, so only one worker migrates at a time
+_LOCK_KEY = 4242_0023
+
+# Outcome of the last run_migrations() in this process, for the health check
+_status = {"state": "pending", "error": None, "applied": []}
+
+
+def _seed_if_empty(conn):
+    # Deployments that seeded on first lookup keep their (possibly operator-edited) rows
+    if conn.execute(text("SELECT 1 FROM product_corrections LIMIT 1")).first() is None:
+        # Seeding filters against the catalog; without one, fail so the next start retries
+        if not catalog.names():
+            raise RuntimeError("product catalog is empty or unavailable, cannot seed product_corrections")
+        seed_corrections(conn)
+
+
+# (version, description, steps). A step is SQL or a callable taking the
+# migration's connection. Append new steps; never edit applied ones.
+MIGRATIONS = [
+    (1, "create conversations", [
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            id SERIAL PRIMARY KEY,
+            restaurant_id INTEGER,
+            restaurant_name VARCHAR(255) NOT NULL,
+            message TEXT NOT NULL,
+            direction VARCHAR(20) NOT NULL DEFAULT 'incoming',
+            parent_message_id INTEGER,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (2, "create checked_orders", [
+        """
+        CREATE TABLE IF NOT EXISTS checked_orders (
+            id SERIAL PRIMARY KEY,
+            restaurant_name VARCHAR(255) NOT NULL,
+            order_date DATE NOT NULL,
+            checked_at TIMESTAMP,
+            amount_of_products INTEGER,
+            UNIQUE (restaurant_name, order_date)
+        )
+        """,
+        # Older deployments created the table before the product count existed
+        "ALTER TABLE checked_orders ADD COLUMN IF NOT EXISTS amount_of_products INTEGER"
+    ]),
+    (3, "create product_corrections", [
+        """
+        CREATE TABLE IF NOT EXISTS product_corrections (
+            raw_word TEXT PRIMARY KEY,
+            product TEXT NOT NULL,
+            source VARCHAR(20) NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (4, "indexes for feed, history and reply lookups", [
+        "CREATE INDEX IF NOT EXISTS conversations_restaurant_created_idx ON conversations (restaurant_name, created_at)",
+        "CREATE INDEX IF NOT EXISTS conversations_parent_message_idx ON conversations (parent_message_id)",
+        "CREATE INDEX IF NOT EXISTS checked_orders_checked_at_idx ON checked_orders (checked_at) WHERE checked_at IS NOT NULL",
+        # restaurant_orders is created outside the app, so only index it if it is there
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('public.restaurant_orders') IS NOT NULL THEN
+                CREATE INDEX IF NOT EXISTS restaurant_orders_restaurant_date_idx
+                    ON restaurant_orders (restaurant_name, date);
+                CREATE INDEX IF NOT EXISTS restaurant_orders_date_idx ON restaurant_orders (date);
+            END IF;
+        END $$
+        """
+    ]),
+    (5, "seed product_corrections", [
+        # Once per database, even if nothing qualified (but never against an empty
+        # catalog): the request path only reads the table
+        _seed_if_empty
+    ]),
+    (6, "conversations.message_id for idempotent inbound rows", [
+        "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS message_id TEXT",
+        # NULLs never conflict, so replies and manual rows without a key are unaffected
+        "CREATE UNIQUE INDEX IF NOT EXISTS conversations_message_id_idx ON conversations (message_id)"
+    ]),
+    (7, "create processed_messages", [
+        # One row per inbound message whose result was committed (see src.saver)
+        """
+        CREATE TABLE IF NOT EXISTS processed_messages (
+            message_id TEXT PRIMARY KEY,
+            processed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+]
+
+
+def run_migrations(engine=None) -> list[int]:
+    """
+    Apply pending schema migrations; returns the versions applied.
+
+    Runs once at startup, so the request path can assume the tables and
+    indexes exist instead of inspecting the schema on every save. The
+    outcome is recorded for migration_status(); errors are re-raised.
+    """
+    try:
+        applied_now = _apply(engine or get_database_engine())
+    except Exception as e:
+        # First line only: the rest is the SQL statement and a docs link
+        _status.update(state="error", error=f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}", applied=[])
+        raise
+    _status.update(state="ok", error=None, applied=applied_now)
+    return applied_now
+
+
+def migration_status() -> dict:
+    """{"state": "pending" | "ok" | "error", "error", "applied"} for this process."""
+    return dict(_status)
+
+
+def _apply(engine) -> list[int]:
+    applied_now = []
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+        for version, description, steps in MIGRATIONS:
+            if version in applied:
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": description}
+            )
+            applied_now.append(version)
+            logger.info("🗄️  Applied migration %s: %s", version, description)
+
+    if not applied_now:
+        logger.info("🗄️  Database schema up to date")
+    return applied_now
@@ -1,10 +1,8 @@
-from openai import OpenAI
 import base64
-import os
 from dotenv import load_dotenv
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from src.ai.client import client
 
 def read_order_image(image_path: str):
     # Load and encode image as base64
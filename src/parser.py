@@ -1,6 +1,6 @@
 import re
 
-from src.db import get_products
+from src.catalog import catalog
 from src.utils.special_cases import apply_special_cases
 
 UNIT_MAP = {
@@ -21,17 +21,67 @@ UNIT_MAP = {
 
 PRODUCT_CATALOG = ["onion", "cola", "rice"]
 
-def extract_product(input_order: str) -> str | None:
+class ProductMatcher:
+    """Finds catalog products in a line with one precompiled regex.
+
+    All names go into a single longest-first alternation wrapped in a
+    lookahead, so one `finditer` reports the longest product starting at
+    every word boundary. That gives the same answer as trying each product's
+    `\\b<name>\\b` pattern in length order, without compiling a pattern per
+    product per line.
+    """
+
+    def __init__(self, names: list[str]):
+        # Same order as the old loop: longest first, catalog order on ties
+        self.names = sorted((n for n in names if n), key=len, reverse=True)
+        self._rank = {}
+        for rank, name in enumerate(self.names):
+            self._rank.setdefault(name.lower(), (rank, name))
+
+        self._pattern = None
+        if self.names:
+            alternation = "|".join(re.escape(n.lower()) for n in self.names)
+            self._pattern = re.compile(r"\b(?=(" + alternation + r")\b)")
+
+    @classmethod
+    def from_products(cls, products):
+        return cls([name for name, _ in products])
+
+    def find_all(self, text: str) -> list[str]:
+        """Return every product found in `text`, longest match first.
+
+        Matches nested inside a longer match ("onion" in "spring onion") are
+        not reported separately. The remaining products follow in the order
+        they appear in the line.
+        """
+        if not self._pattern:
+            return []
+
+        spans = []
+        for m in self._pattern.finditer(text):
+            spans.append((m.start(1), m.end(1), m.group(1)))
+        if not spans:
+            return []
+
+        primary = min(spans, key=lambda span: self._rank[span[2]][0])
+        found = [self._rank[primary[2]][1]]
+        for start, end, word in spans:
+            name = self._rank[word][1]
+            if name in found:
+                continue
+            if any(s <= start and end <= e and (s, e) != (start, end) for s, e, _ in spans):
+                continue
+            found.append(name)
+        return found
+
+
+def get_product_matcher() -> ProductMatcher:
+    return catalog.derived("product_matcher", ProductMatcher.from_products)
+
+
+def extract_product(input_order: str) -> list[str]:
     text = re.sub(r"[^a-z0-9\s]", " ", input_order.lower())
-    matches = []
-
-    products = sorted(get_products(), key=lambda x: len(x[0]), reverse=True)
-
-    for name, units in products:
-        pattern = r"\b" + re.escape(name.lower()) + r"\b"
-        if re.search(pattern, text):
-            return [name]
-    return matches
+    return get_product_matcher().find_all(text)
 
 
 def parser_order(input_order):
@@ -87,11 +137,72 @@ def parser_order(input_order):
         }
 
 
-def get_primary_units():
+def _build_primary_units(products):
     product_units = {}
-    for name, units in get_products():  # e.g. ("Cabbage White", ["bag", "pieces"])
+    for name, units in products:  # e.g. ("Cabbage White", ["bag", "pieces"])
         if units:
             primary = units[0]  # take the first unit as default
             product_units[name.lower()] = primary
     return product_units
 
+
+def get_primary_units():
+    return catalog.derived("primary_units", _build_primary_units)
+
+
+class PrimaryUnitIndex:
+    """Primary unit lookup by product name without scanning the catalog.
+
+    Gives the same answer as checking `get_primary_units()` for an exact key
+    and then scanning it in order for the first name that contains, or is
+    contained in, the product. Every substring of every catalog name is
+    indexed to the first name containing it, so "names containing the
+    product" is one dict lookup; "names contained in the product" checks the
+    query's own substrings (up to the longest name) against the exact-name
+    table, O(len(product) * longest name) lookups. The price is memory:
+    O(sum of len(name)**2) keys, about 14k entries (~1.2MB) for the
+    current catalog.
+    """
+
+    def __init__(self, primary_units: dict[str, str]):
+        self.units = primary_units
+        self._rank = {name: rank for rank, name in enumerate(primary_units)}
+        self._names = list(primary_units)
+        self._max_len = max((len(name) for name in self._names), default=0)
+        self._containing = {}
+        for rank, name in enumerate(self._names):
+            for i in range(len(name)):
+                for j in range(i + 1, len(name) + 1):
+                    self._containing.setdefault(name[i:j], rank)
+
+    @classmethod
+    def from_products(cls, products):
+        return cls(_build_primary_units(products))
+
+    def lookup(self, product: str) -> tuple[str, str] | None:
+        """Return (catalog name, primary unit) for `product`, or None."""
+        product_lower = product.lower().strip()
+        if self.units.get(product_lower):
+            return product_lower, self.units[product_lower]
+        if not self._names:
+            return None
+
+        # Names that contain the product ("" is contained in every name)
+        best = self._containing.get(product_lower, 0 if not product_lower else None)
+
+        # Names contained in the product
+        for i in range(len(product_lower)):
+            for j in range(i + 1, min(len(product_lower), i + self._max_len) + 1):
+                rank = self._rank.get(product_lower[i:j])
+                if rank is not None and (best is None or rank < best):
+                    best = rank
+
+        if best is None:
+            return None
+        name = self._names[best]
+        return name, self.units[name]
+
+
+def get_primary_unit_index() -> PrimaryUnitIndex:
+    return catalog.derived("primary_unit_index", PrimaryUnitIndex.from_products)
+
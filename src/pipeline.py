@@ -0,0 +1,233 @@
+import asyncio
+import threading
+import time
+
+from src.parser import parser_order
+from src.utils.special_cases import apply_special_cases
+from src.validator import validate_order, prefetch_fuzzy_candidates, prefetch_ai_suggestions
+from src.budget import LatencyBudget
+from src.saver import save_order_batch
+from src.input_tool import input_text_tool
+from src.alerts import alert_dispatcher
+from src.catalog import catalog
+from src.correction_cache import refresh_corrections
+from src.ai.order_parser import ai_parse_order_async, normalize_order_async
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+STAGES = ("parse", "match", "validate", "save")
+
+
+def warm_caches():
+    """
+    Refresh the product catalog and learned corrections if they are stale.
+
+    Both may query PostgreSQL, so async callers run this in a thread first;
+    the lookups made on the event loop afterwards are then served from memory.
+    """
+    catalog.products()
+    refresh_corrections()
+
+
+def _wants_ai_parse(body: str) -> bool:
+    """Add/remove edits are free text that only the AI parser understands."""
+    return "add" in body.lower() or "remove" in body.lower()
+
+
+class OrderPipeline:
+    """
+    Turns one order message into saved order lines, in four stages:
+
+    - parse: AI parse for add/remove edits, otherwise normalize the message and
+      run parser_order + special cases on every line
+    - match: batch fuzzy scoring and concurrent AI matching for all lines at once
+    - validate: validate_order on each line
+    - save: every line and the checked_orders entry in one transaction (see
+      save_order_batch), then one coalesced manager alert for what was
+      committed; the conversations row for the message is written before the
+      pipeline runs
+
+    Stages that block (database reads and writes, RapidFuzz scoring, the
+    catalog refresh) run in worker threads, so the event loop keeps serving
+    other messages meanwhile.
+
+    Each stage is timed, per run (`timings`) and in aggregate (`stats()`).
+    Pass save=False to get the validated lines without touching the database,
+    e.g. from tests or dry-run batch jobs.
+    """
+
+    def __init__(self):
+        self.runs = 0
+        self._totals = {stage: 0.0 for stage in STAGES}
+        self._lock = threading.Lock()
+
+    async def run(self, body: str, restaurant_id, restaurant_name: str,
+                  budget: LatencyBudget = None, save: bool = True, message_id: str = None) -> dict:
+        budget = budget or LatencyBudget()
+        timings = {}
+        await asyncio.to_thread(warm_caches)
+
+        started = time.perf_counter()
+        lines = await self.parse(body, restaurant_name, budget)
+        timings["parse"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await self.match(lines, budget)
+        timings["match"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await asyncio.to_thread(self.validate, lines, budget)
+        timings["validate"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if save:
+            results, saved_count = await asyncio.to_thread(
+                self.save, lines, body, restaurant_id, restaurant_name, message_id
+            )
+        else:
+            results, saved_count = [line.get("validated") or line for line in lines], 0
+        timings["save"] = time.perf_counter() - started
+
+        self._record(timings)
+        return {
+            "orders": results,
+            "saved_count": saved_count,
+            "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()}
+        }
+
+    async def parse(self, body: str, restaurant_name: str, budget: LatencyBudget) -> list[dict]:
+        """
+        Return one dict per order line:
+        {"raw_message", "parsed" (parser output), "ai_item" (AI parse, or None), "remove"}
+        """
+        if _wants_ai_parse(body):
+            try:
+                parsed_items = await ai_parse_order_async(body, budget)
+            except ValueError as e:
+                # OpenAI not available, fall back to regular parsing
+                logger.warning("⚠️  AI parsing unavailable: %s. Falling back to regular parsing.", e)
+                parsed_items = []
+
+            if parsed_items:
+                return [{
+                    "raw_message": body,
+                    "parsed": {
+                        "parsed": item,  # ✅ AI extracted fields
+                        "extras": {
+                            "raw_input": item.get("product", ""),  # ✅ raw guess from AI
+                            "raw_matches": [item.get("product", "")]
+                        }
+                    },
+                    "ai_item": item,
+                    "remove": item["action"] == "remove"
+                } for item in parsed_items]
+
+        normalize_body, line_mapping = await normalize_order_async(body, budget)
+        incoming = input_text_tool(normalize_body, restaurant_name)
+
+        lines = []
+        for normalized_line in incoming["orders"]:
+            # Normalized lines are already stripped by input_text_tool, so strip for lookup
+            normalized_line_stripped = normalized_line.strip()
+            original_line = line_mapping.get(normalized_line_stripped, normalized_line_stripped)
+
+            parsed = parser_order(normalized_line_stripped)
+            special = apply_special_cases(parsed["parsed"]["product"])
+            if special:
+                parsed["parsed"]["product"] = special
+            lines.append({"raw_message": original_line, "parsed": parsed, "ai_item": None, "remove": False})
+        return lines
+
+    async def match(self, lines: list[dict], budget: LatencyBudget):
+        """Score every unresolved line in one batch and run the AI matches concurrently."""
+        parsed_outputs = [line["parsed"] for line in lines if not line["remove"]]
+        await asyncio.to_thread(prefetch_fuzzy_candidates, parsed_outputs)
+        await prefetch_ai_suggestions(parsed_outputs, budget)
+
+    def validate(self, lines: list[dict], budget: LatencyBudget = None):
+        for line in lines:
+            if line["remove"]:
+                continue
+            validated = validate_order(line["parsed"])
+            validated["raw_message"] = line["raw_message"]  # Original line, not normalized
+            if budget and budget.was_skipped("normalization", line["raw_message"]):
+                # Parsed as typed, so the quantity/unit/product split is a guess
+                validated["needs_review"] = True
+                validated["errors"].append("Line kept as typed (normalization skipped) - please review")
+                if validated["action"] == "continue":
+                    validated["action"] = "send_to_human"
+            line["validated"] = validated
+
+    def save(self, lines: list[dict], body: str, restaurant_id, restaurant_name: str,
+             message_id: str = None) -> tuple[list[dict], int]:
+        """
+        Store all lines of the message in one transaction, then queue one
+        manager alert. Alerts only go out after the commit: none for a
+        message that was already saved, and red alerts only for lines that
+        were actually stored. Remove requests are never stored, so they are
+        always reported.
+        """
+        # Red-alert lines are still saved, flagged for attention
+        to_save = [line for line in lines if not line["remove"]]
+        batch = save_order_batch([line["validated"] for line in to_save], restaurant_id, restaurant_name, message_id)
+        saved_by_line = {id(line): saved for line, saved in zip(to_save, batch["results"])}
+
+        if not batch["duplicate"]:
+            alerts = []
+            for line in lines:
+                if line["remove"]:
+                    alerts.append((body, ["REMOVE request detected — manual handling required"]))
+                elif (line["validated"].get("action") == "red_alert" and not line["ai_item"]
+                      and saved_by_line[id(line)].get("status") == "saved"):
+                    alerts.append((line["raw_message"], line["validated"].get("red_alerts", [])))
+            alert_dispatcher.notify(restaurant_name, alerts)
+
+        results = []
+        for line in lines:
+            if line["remove"]:
+                results.append({"status": "red_alert", "item": line["ai_item"]})
+                continue
+
+            validated = line["validated"]
+            saved = saved_by_line[id(line)]
+            if saved.get("status") == "saved":
+                saved["parsed"] = validated.get("validated")
+                if line["ai_item"]:
+                    saved["original_input"] = line["ai_item"]
+                else:
+                    saved["original_parsed"] = line["parsed"].get("parsed")
+            if not line["ai_item"]:
+                saved["raw_message"] = line["raw_message"]
+                if validated.get("action") == "red_alert":
+                    saved["red_alerts"] = validated.get("red_alerts", [])
+            results.append(saved)
+        return results, batch["saved_count"]
+
+    def _record(self, timings: dict):
+        with self._lock:
+            self.runs += 1
+            for stage, seconds in timings.items():
+                self._totals[stage] += seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "avg_stage_ms": {
+                    stage: round(total * 1000 / self.runs, 2) if self.runs else 0.0
+                    for stage, total in self._totals.items()
+                }
+            }
+
+
+order_pipeline = OrderPipeline()
+
+
+async def process_order(body: str, restaurant_id, restaurant_name: str,
+                        budget: LatencyBudget = None, save: bool = True, message_id: str = None) -> dict:
+    return await order_pipeline.run(body, restaurant_id, restaurant_name, budget, save, message_id)
+
+
+def get_pipeline_stats() -> dict:
+    return order_pipeline.stats()
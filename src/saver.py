@@ -1,128 +1,244 @@
+import io
 import os
-import pandas as pd
 from datetime import datetime, date
-from sqlalchemy import create_engine, text
-from src.logger import log_correction
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, Numeric, Table, Text, text, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.database import get_engine
+from src.logger import log_correction, get_logger
+
+logger = get_logger(__name__)
+
+# Batches at least this large are written with COPY instead of INSERT
+COPY_THRESHOLD = int(os.getenv("COPY_THRESHOLD", 500))
 
-# Create a singleton engine that's reused across all database operations
-# This is much faster than creating a new engine on every call
-_engine = None
 
 def get_database_engine():
-    """Get SQLAlchemy engine with proper connection string format.
-    
-    Uses the same DATABASE_URL as the existing database connections (db.py).
-    Handles Railway's postgres:// format and converts to postgresql+psycopg2:// for SQLAlchemy.
-    Creates and reuses a singleton engine for better performance.
+    """Get the shared SQLAlchemy engine.
+
+    The engine and its connection pool live in src.database and also back
+    src.db, so the whole app draws from one configurable pool.
     """
-    global _engine
-    if _engine is not None:
-        return _engine
-    
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if not DATABASE_URL:
-        raise ValueError("DATABASE_URL environment variable is not set")
-    
-    # Railway's DATABASE_URL might use postgres:// instead of postgresql://
-    # Convert to postgresql:// first (like db.py does)
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    
-    # Ensure the connection string uses psycopg2 driver for SQLAlchemy
-    if DATABASE_URL.startswith("postgresql://") and not DATABASE_URL.startswith("postgresql+psycopg2://"):
-        DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+psycopg2://", 1)
-    
-    # Create engine with connection pooling for better performance
-    _engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,  # Verify connections before using them
-        pool_recycle=3600,   # Recycle connections after 1 hour
-        pool_timeout=10,     # Timeout for getting connection from pool
-        connect_args={"connect_timeout": 10},  # Connection timeout
-        echo=True            # Set to True for SQL debugging - shows actual SQL queries
-    )
-    return _engine
+    return get_engine()
 
 
-def save_order(validated_output: dict, restaurant_id: int, restaurant_name: str, filepath = None):
-    # Allow saving even if product is missing (save with errors)
-    if not validated_output.get("validated"):
-        return {
-            "status": "skipped",
-            "errors": validated_output.get("errors", []),
-            "raw_message": validated_output.get("raw_message", ""),
-            "parsed": validated_output.get("validated", {})
-        }
+# Core tables for inserts (the DDL lives in src.migrations and PRODUCTION_CHECKLIST.md).
+# Ordered RETURNING inserts cast every value, hence the types; strings are Text
+# so a cast never truncates.
+_metadata = MetaData(schema="public")
+
+_restaurant_orders = Table(
+    "restaurant_orders", _metadata,
+    Column("id", Integer, primary_key=True), Column("restaurant_id", Integer), Column("restaurant_name", Text),
+    Column("quantity", Numeric), Column("unit", Text), Column("product", Text), Column("corrections", Text),
+    Column("date", DateTime), Column("original_text", Text), Column("need_attention", Boolean),
+    Column("message", Text)
+)
+
+_conversations = Table(
+    "conversations", _metadata,
+    Column("id", Integer, primary_key=True), Column("restaurant_id", Integer), Column("restaurant_name", Text),
+    Column("message", Text), Column("direction", Text), Column("parent_message_id", Integer),
+    Column("created_at", DateTime), Column("message_id", Text)
+)
+
+
+def insert_rows(conn, target, rows: list[dict], returning: bool = False) -> list | None:
+    """
+    Insert rows (dicts with the same keys) into a Core `Table`.
+
+    Small batches are one prepared INSERT. With `returning`, the new ids are
+    returned in the order of `rows`: PostgreSQL does not promise RETURNING
+    order, so SQLAlchemy (sort_by_parameter_order) tags each row and sorts
+    the returned ids back into parameter order. Batches of
+    COPY_THRESHOLD rows or more that need no ids are streamed with COPY.
+    Database errors propagate unchanged, so callers keep classifying them.
+    """
+    if not rows:
+        return [] if returning else None
+    if returning:
+        return conn.execute(insert(target).returning(target.c.id, sort_by_parameter_order=True), rows).scalars().all()
+    if len(rows) >= COPY_THRESHOLD:
+        _copy_rows(conn, target, rows)
+    else:
+        conn.execute(insert(target), rows)
+    return None
+
+
+def _csv_field(value) -> str:
+    """
+    One COPY CSV field. NULL is an unquoted \\N and every other value is
+    quoted, so an empty string or a literal "\\N" text stays a value.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    elif isinstance(value, datetime):
+        value = value.isoformat(sep=" ")
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy_csv(columns: list[str], rows: list[dict]) -> io.StringIO:
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_csv_field(row[name]) for name in columns) + "\n")
+    buffer.seek(0)
+    return buffer
+
+
+def _copy_rows(conn, target, rows: list[dict]):
+    columns = list(rows[0])
+    buffer = _copy_csv(columns, rows)
+
+    name = f"{target.schema}.{target.name}" if target.schema else target.name
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def bulk_insert(target, rows: list[dict]):
+    """Load a large batch (e.g. a CSV import) in one transaction with COPY."""
+    if not rows:
+        return
+    with get_database_engine().begin() as conn:
+        _copy_rows(conn, target, rows)
 
-    engine = get_database_engine()
 
+def import_orders(rows: list[dict]) -> int:
+    """
+    Bulk-load restaurant_orders rows (dicts with the _order_row() keys), e.g.
+    from a CSV export. The foreign key still applies: an unknown
+    restaurant_id fails the whole import. Returns the number of rows loaded.
+    """
+    bulk_insert(_restaurant_orders, rows)
+    return len(rows)
+
+
+def _mark_processed(conn, message_id: str | None) -> bool:
+    """
+    Claim message_id in processed_messages inside the caller's transaction.
+
+    Returns False if the message was already committed once (a queue retry
+    after a crash or an expired lease), so the caller writes nothing. A
+    concurrent attempt waits on the primary key until the first commits.
+    """
+    if message_id is None:
+        return True
+    return conn.execute(text("""
+        INSERT INTO processed_messages (message_id, processed_at) VALUES (:message_id, :processed_at)
+        ON CONFLICT (message_id) DO NOTHING
+        RETURNING message_id
+    """), {"message_id": message_id, "processed_at": datetime.now()}).first() is not None
+
+
+def _duplicate(validated_output: dict) -> dict:
+    return {
+        "status": "duplicate",
+        "parsed": validated_output.get("validated", {}),
+        "raw_message": validated_output.get("raw_message", "")
+    }
+
+
+def _skipped(validated_output: dict) -> dict:
+    return {
+        "status": "skipped",
+        "errors": validated_output.get("errors", []),
+        "raw_message": validated_output.get("raw_message", ""),
+        "parsed": validated_output.get("validated", {})
+    }
+
+
+def _order_row(validated_output: dict, restaurant_id: int, restaurant_name: str, now: datetime) -> dict:
+    """Build the restaurant_orders row for one validated line."""
     validated = validated_output["validated"]
     # Combine errors and red_alerts for the corrections column
     all_errors = validated_output.get("errors", []) + validated_output.get("red_alerts", [])
     errors = "; ".join(all_errors) if all_errors else None
     raw_message = validated_output.get("raw_message", "")
-    need_attention = bool(validated_output.get("red_alerts"))
-    
+    need_attention = bool(validated_output.get("red_alerts")) or bool(validated_output.get("needs_review"))
+
     # Mark as needing attention if there are red_alerts (stored in corrections column)
     if validated_output.get("red_alerts"):
         errors = errors if errors else "RED ALERT: " + "; ".join(validated_output.get("red_alerts", []))
-    
+
     # Handle restaurant_id: if None, we can't insert due to foreign key constraint
-    # Set to None in the database (if column allows NULL) or handle gracefully
     # Since restaurant_id is a foreign key, we'll pass None and let the database handle it
     # If the column doesn't allow NULL, this will need to be handled at the schema level
-    db_restaurant_id = restaurant_id if restaurant_id is not None else None
-    
-    # Create DataFrame with data matching database schema
-    data = {
-        "restaurant_id": [db_restaurant_id],
-        "restaurant_name": [restaurant_name],
-        "quantity": [validated.get("quantity")],
-        "unit": [validated.get("unit")],
-        "product": [validated.get("product")],
-        "corrections": [errors],
-        "date": [datetime.now()],  # Use datetime object for TIMESTAMP
-        "original_text": [raw_message],
-        "need_attention": [need_attention],
-        "message": [raw_message]  # message column
+    return {
+        "restaurant_id": restaurant_id,
+        "restaurant_name": restaurant_name,
+        "quantity": validated.get("quantity"),
+        "unit": validated.get("unit"),
+        "product": validated.get("product"),
+        "corrections": errors,
+        "date": now,  # Use datetime object for TIMESTAMP
+        "original_text": raw_message,
+        "need_attention": need_attention,
+        "message": raw_message  # message column
     }
-    
-    df = pd.DataFrame(data)
-    
+
+
+def _classify_order_error(error: Exception, restaurant_id: int) -> dict | None:
+    """
+    Map a known restaurant_orders insert failure to an error result, or None
+    to re-raise. Errors raised by any other statement are never classified.
+    """
+    if "restaurant_orders" not in (getattr(error, "statement", None) or ""):
+        return None
+    error_msg = str(error)
+    if "does not exist" in error_msg.lower() or "relation" in error_msg.lower() and "does not exist" in error_msg.lower():
+        logger.warning("⚠️  Table 'restaurant_orders' may not exist in the database")
+        logger.warning("   Please verify the table exists with: SELECT * FROM restaurant_orders LIMIT 1;")
+        return {
+            "status": "error",
+            "error": "table_not_found",
+            "message": "Table 'restaurant_orders' does not exist in database"
+        }
+    elif "foreign key" in error_msg.lower() or "violates foreign key constraint" in error_msg.lower():
+        logger.warning("⚠️  Database error: Foreign key constraint violation for restaurant_id=%s", restaurant_id)
+        logger.warning("   This order will not be saved. Error: %s", error_msg)
+        return {
+            "status": "error",
+            "error": "restaurant_not_found",
+            "message": f"Restaurant ID {restaurant_id} does not exist in database"
+        }
+    return None
+
+
+def save_order(validated_output: dict, restaurant_id: int, restaurant_name: str, filepath = None):
+    # Allow saving even if product is missing (save with errors)
+    if not validated_output.get("validated"):
+        return _skipped(validated_output)
+
+    engine = get_database_engine()
+
+    validated = validated_output["validated"]
+    all_errors = validated_output.get("errors", []) + validated_output.get("red_alerts", [])
+    raw_message = validated_output.get("raw_message", "")
+
+    row = _order_row(validated_output, restaurant_id, restaurant_name, datetime.now())
+
     # Insert into database with error handling
     try:
-        # Try with schema-qualified table name first, fallback to just table name
-        df.to_sql("restaurant_orders", engine, if_exists="append", index=False, schema="public")
+        with engine.begin() as conn:
+            insert_rows(conn, _restaurant_orders, [row])
     except Exception as e:
         # Handle foreign key constraint violations or other database errors
         error_msg = str(e)
-        print(f"⚠️  Database error details: {error_msg}")
-        print(f"   Error type: {type(e).__name__}")
-        
-        if "does not exist" in error_msg.lower() or "relation" in error_msg.lower() and "does not exist" in error_msg.lower():
-            print(f"⚠️  Table 'restaurant_orders' may not exist in the database")
-            print(f"   Please verify the table exists with: SELECT * FROM restaurant_orders LIMIT 1;")
-            return {
-                "status": "error",
-                "error": "table_not_found",
-                "message": "Table 'restaurant_orders' does not exist in database",
-                "parsed": validated,
-                "raw_message": raw_message
-            }
-        elif "foreign key" in error_msg.lower() or "violates foreign key constraint" in error_msg.lower():
-            print(f"⚠️  Database error: Foreign key constraint violation for restaurant_id={restaurant_id}")
-            print(f"   This order will not be saved. Error: {error_msg}")
-            return {
-                "status": "error",
-                "error": "restaurant_not_found",
-                "message": f"Restaurant ID {restaurant_id} does not exist in database",
-                "parsed": validated,
-                "raw_message": raw_message
-            }
-        else:
+        logger.warning("⚠️  Database error details: %s", error_msg)
+        logger.warning("   Error type: %s", type(e).__name__)
+
+        result = _classify_order_error(e, restaurant_id)
+        if result is None:
             # Re-raise other database errors with full details
-            print(f"⚠️  Database error: {error_msg}")
+            logger.warning("⚠️  Database error: %s", error_msg)
             raise
+        return {**result, "parsed": validated, "raw_message": raw_message}
 
     # ✅ Log corrections separately if errors or red_alerts exist
     if all_errors:
@@ -145,10 +261,112 @@ def save_order(validated_output: dict, restaurant_id: int, restaurant_name: str,
     }
 
 
-def save_to_conversations(message: str, restaurant_id: int, restaurant_name: str, direction: str = "incoming", parent_message_id: int = None):
+def save_order_batch(validated_outputs: list[dict], restaurant_id: int, restaurant_name: str,
+                     message_id: str = None) -> dict:
+    """
+    Save every validated line of one message in a single transaction.
+
+    The lines go in as one multi-row INSERT ... RETURNING id. The
+    checked_orders count is upserted in the same transaction (inside a
+    savepoint, so a missing checked_orders table does not undo the order).
+    The incoming message itself is recorded in conversations beforehand,
+    with save_to_conversations().
+
+    With a message_id, the transaction also records it in processed_messages;
+    if it is already there, nothing is written and every line comes back as
+    "duplicate".
+
+    Returns {"results": [one save_order()-style dict per line, with "id"],
+             "saved_count": int, "duplicate": bool}.
+    """
+    engine = get_database_engine()
+    now = datetime.now()
+
+    rows, positions = [], []
+    results = [None] * len(validated_outputs)
+    for i, validated_output in enumerate(validated_outputs):
+        # Allow saving even if product is missing (save with errors)
+        if not validated_output.get("validated"):
+            results[i] = _skipped(validated_output)
+            continue
+        rows.append(_order_row(validated_output, restaurant_id, restaurant_name, now))
+        positions.append(i)
+    if not rows and message_id is None:
+        return {"results": results, "saved_count": 0, "duplicate": False}
+
+    try:
+        with engine.begin() as conn:
+            if not _mark_processed(conn, message_id):
+                logger.info("🔁 Message %s was already saved, skipping its %s line(s)", message_id, len(rows))
+                for i in positions:
+                    results[i] = _duplicate(validated_outputs[i])
+                return {"results": results, "saved_count": 0, "duplicate": True}
+            if not rows:
+                # Nothing to store (e.g. only remove requests), but the message counts as handled
+                return {"results": results, "saved_count": 0, "duplicate": False}
+            ids = insert_rows(conn, _restaurant_orders, rows, returning=True)
+            try:
+                # Savepoint: a missing checked_orders table must not roll back the order
+                with conn.begin_nested():
+                    conn.execute(text("""
+                        INSERT INTO checked_orders (restaurant_name, order_date, checked_at, amount_of_products)
+                        VALUES (:restaurant_name, :order_date, :checked_at, :amount_of_products)
+                        ON CONFLICT (restaurant_name, order_date) DO UPDATE
+                        SET checked_at = :checked_at,
+                            amount_of_products = :amount_of_products
+                    """), {
+                        "restaurant_name": restaurant_name,
+                        "order_date": now.date(),
+                        "checked_at": now,
+                        "amount_of_products": len(rows)
+                    })
+            except Exception as e:
+                logger.warning("⚠️  Could not update checked_orders: %s", e)
+    except Exception as e:
+        logger.warning("⚠️  Database error details: %s", e)
+        logger.warning("   Error type: %s", type(e).__name__)
+
+        error = _classify_order_error(e, restaurant_id)
+        if error is None:
+            logger.warning("⚠️  Database error: %s", e)
+            raise
+        for i in positions:
+            results[i] = {
+                **error,
+                "parsed": validated_outputs[i]["validated"],
+                "raw_message": validated_outputs[i].get("raw_message", "")
+            }
+        return {"results": results, "saved_count": 0, "duplicate": False}
+
+    for i, row_id in zip(positions, ids):
+        validated_output = validated_outputs[i]
+        all_errors = validated_output.get("errors", []) + validated_output.get("red_alerts", [])
+        # ✅ Log corrections separately if errors or red_alerts exist
+        if all_errors:
+            log_correction(
+                restaurant=restaurant_name,
+                raw_message=validated_output.get("raw_message", ""),
+                corrections=all_errors
+            )
+        results[i] = {
+            "status": "saved",
+            "id": row_id,
+            "parsed": validated_output["validated"],
+            "raw_message": validated_output.get("raw_message", ""),
+            "errors": validated_output.get("errors", [])
+        }
+
+    logger.info("✅ Saved %s order line(s) for %s in one transaction", len(ids), restaurant_name)
+    return {"results": results, "saved_count": len(ids), "duplicate": False}
+
+
+def save_to_conversations(message: str, restaurant_id: int, restaurant_name: str, direction: str = "incoming",
+                          parent_message_id: int = None, message_id: str = None):
     """
     Save a message to the conversations table.
-    Creates the table if it doesn't exist.
+    The table is created by the startup migrations (src.migrations).
+    With a message_id (the ingest idempotency key), saving the same inbound
+    message again, e.g. on a queue retry, is a no-op.
     
     Args:
         message: The message text
@@ -156,103 +374,59 @@ def save_to_conversations(message: str, restaurant_id: int, restaurant_name: str
         restaurant_name: Restaurant name
         direction: 'incoming' or 'outgoing' (default: 'incoming')
         parent_message_id: ID of parent message if this is a reply (default: None)
+        message_id: Idempotency key of the inbound message (default: None)
     """
-    from sqlalchemy import text, inspect
-    
     engine = get_database_engine()
     db_restaurant_id = restaurant_id if restaurant_id is not None else None
     
-    # Check if conversations table exists, create it if it doesn't
-    inspector = inspect(engine)
-    table_exists = "conversations" in inspector.get_table_names(schema="public")
-    
-    if not table_exists:
-        print("📋 Creating conversations table...")
-        create_table_query = text("""
-            CREATE TABLE IF NOT EXISTS conversations (
-                id SERIAL PRIMARY KEY,
-                restaurant_id INTEGER,
-                restaurant_name VARCHAR(255) NOT NULL,
-                message TEXT NOT NULL,
-                direction VARCHAR(20) NOT NULL DEFAULT 'incoming',
-                parent_message_id INTEGER,
-                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        with engine.connect() as conn:
-            conn.execute(create_table_query)
-            conn.commit()
-        print("✅ Conversations table created")
-    
-    # Create DataFrame with data matching conversations table schema
-    data = {
-        "restaurant_id": [db_restaurant_id],
-        "restaurant_name": [restaurant_name],
-        "message": [message],
-        "direction": [direction],
-        "parent_message_id": [parent_message_id],
-        "created_at": [datetime.now()]
+    row = {
+        "restaurant_id": db_restaurant_id,
+        "restaurant_name": restaurant_name,
+        "message": message,
+        "direction": direction,
+        "parent_message_id": parent_message_id,
+        "created_at": datetime.now(),
+        "message_id": message_id
     }
-    
-    df = pd.DataFrame(data)
-    
+
     # Insert into conversations table with error handling
     try:
-        print(f"🔍 Attempting to save to conversations table...")
-        print(f"   DataFrame shape: {df.shape}")
-        print(f"   DataFrame columns: {list(df.columns)}")
-        print(f"   DataFrame data:\n{df.to_string()}")
-        
+        # Lazy %-args: the row is only rendered if the debug record is kept
+        logger.debug("🔍 Saving to conversations table: %s", row)
+
         # Use begin() to ensure transaction is committed
         with engine.begin() as conn:
-            df.to_sql("conversations", conn, if_exists="append", index=False, schema="public", method='multi')
-        
-        print(f"✅ Message saved to conversations table: {restaurant_name} - {direction}")
-        print(f"   Message content: {message[:100]}{'...' if len(message) > 100 else ''}")
-        print(f"   Parent message ID: {parent_message_id}")
-        
-        # Verify it was actually saved
-        verify_query = text("""
-            SELECT id, message, created_at 
-            FROM conversations 
-            WHERE restaurant_name = :restaurant_name 
-            AND direction = :direction
-            AND parent_message_id = :parent_message_id
-            ORDER BY created_at DESC 
-            LIMIT 1
-        """)
-        with engine.connect() as conn:
-            result = conn.execute(verify_query, {
-                "restaurant_name": restaurant_name,
-                "direction": direction,
-                "parent_message_id": parent_message_id
-            })
-            row = result.fetchone()
-            if row:
-                print(f"✅ VERIFIED: Message saved with ID {row[0]}, created at {row[2]}")
+            if message_id is None:
+                insert_rows(conn, _conversations, [row])
             else:
-                print(f"⚠️  WARNING: Could not verify saved message - query returned no results")
+                conn.execute(pg_insert(_conversations).values(row).on_conflict_do_nothing(index_elements=["message_id"]))
         
+        logger.info("✅ Message saved to conversations table: %s - %s", restaurant_name, direction)
+        logger.debug("   Message content: %.100s", message)
+        logger.debug("   Parent message ID: %s", parent_message_id)
+
         return True
     except Exception as e:
         error_msg = str(e)
         # Log the full error with traceback
-        import traceback
-        print(f"❌ ERROR: Could not save to conversations table: {error_msg}")
-        print(f"   Attempted to save message: {message[:100]}{'...' if len(message) > 100 else ''}")
-        print(f"   Full error traceback:")
-        traceback.print_exc()
+        logger.exception(
+            "❌ ERROR: Could not save to conversations table: %s\n"
+            "   Attempted to save message: %.100s",
+            error_msg, message
+        )
         # Re-raise the error so the caller knows it failed
         raise
 
 
-def save_message(message: str, restaurant_id: int, restaurant_name: str, filepath = None):
+def save_message(message: str, restaurant_id: int, restaurant_name: str, filepath = None, message_id: str = None):
     """
     Save a natural conversation message (not an order) to the database.
     Only fills: restaurant_id, restaurant_name, date, and message columns.
     All order-related columns (quantity, unit, product) remain empty.
     Messages are flagged with need_attention=True for review.
     Also saves to conversations table.
+    With a message_id, a message that was already saved is not saved again
+    (see save_order_batch).
     """
     engine = get_database_engine()
     
@@ -260,31 +434,37 @@ def save_message(message: str, restaurant_id: int, restaurant_name: str, filepat
     # Set to None in the database (if column allows NULL) or handle gracefully
     db_restaurant_id = restaurant_id if restaurant_id is not None else None
     
-    # Create DataFrame with data matching database schema
-    data = {
-        "restaurant_id": [db_restaurant_id],
-        "restaurant_name": [restaurant_name],
-        "quantity": [None],  # empty for messages
-        "unit": [None],  # empty for messages
-        "product": [None],  # empty for messages
-        "corrections": [None],  # empty for messages
-        "date": [datetime.now()],  # Use datetime object for TIMESTAMP
-        "original_text": [None],  # empty for messages
-        "need_attention": [True],  # messages need review
-        "message": [message]  # message column
+    # Row matching the restaurant_orders schema
+    row = {
+        "restaurant_id": db_restaurant_id,
+        "restaurant_name": restaurant_name,
+        "quantity": None,  # empty for messages
+        "unit": None,  # empty for messages
+        "product": None,  # empty for messages
+        "corrections": None,  # empty for messages
+        "date": datetime.now(),  # Use datetime object for TIMESTAMP
+        "original_text": None,  # empty for messages
+        "need_attention": True,  # messages need review
+        "message": message  # message column
     }
-    
-    df = pd.DataFrame(data)
-    
+
+    # Conversations row first: keyed by message_id, so a retry after a crash
+    # below still finds it and never adds a second one
+    save_to_conversations(message, restaurant_id, restaurant_name, direction="incoming", message_id=message_id)
+
     # Insert into database with error handling
     try:
-        df.to_sql("restaurant_orders", engine, if_exists="append", index=False)
+        with engine.begin() as conn:
+            if not _mark_processed(conn, message_id):
+                logger.info("🔁 Message %s was already saved, skipping it", message_id)
+                return {"status": "duplicate", "message": message, "restaurant_name": restaurant_name}
+            insert_rows(conn, _restaurant_orders, [row])
     except Exception as e:
         # Handle foreign key constraint violations or other database errors
         error_msg = str(e)
         if "foreign key" in error_msg.lower() or "violates foreign key constraint" in error_msg.lower():
-            print(f"⚠️  Database error: Foreign key constraint violation for restaurant_id={restaurant_id}")
-            print(f"   This message will not be saved. Error: {error_msg}")
+            logger.warning("⚠️  Database error: Foreign key constraint violation for restaurant_id=%s", restaurant_id)
+            logger.warning("   This message will not be saved. Error: %s", error_msg)
             return {
                 "status": "error",
                 "error": "restaurant_not_found",
@@ -293,12 +473,9 @@ def save_message(message: str, restaurant_id: int, restaurant_name: str, filepat
             }
         else:
             # Re-raise other database errors
-            print(f"⚠️  Database error: {error_msg}")
+            logger.warning("⚠️  Database error: %s", error_msg)
             raise
     
-    # Also save to conversations table
-    save_to_conversations(message, restaurant_id, restaurant_name, direction="incoming")
-    
     return {
         "status": "message_saved",
         "message": message,
@@ -349,7 +526,7 @@ def save_checked_order(restaurant_name: str, order_date: date = None, amount_of_
                 row = result.fetchone()
                 product_count = row[0] if row else 0
         except Exception as e:
-            print(f"⚠️  Error counting products: {e}")
+            logger.warning("⚠️  Error counting products: %s", e)
             product_count = 0
     
     # Only save if there are products (avoid saving empty orders)
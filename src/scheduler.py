@@ -0,0 +1,116 @@
+import asyncio
+import os
+import zlib
+
+# Number of lanes messages are sharded over; messages in different lanes run in parallel
+ORDER_LANES = int(os.getenv("ORDER_LANES", 8))
+
+
+class LaneScheduler:
+    """
+    Runs jobs in per-key FIFO lanes.
+
+    A key (restaurant id or name) is hashed to one of `lanes` lanes. Each lane
+    runs its jobs one at a time in submission order, so two messages from one
+    restaurant ("3bg onion", then "remove onion") are applied in the order
+    they arrived, while different restaurants are processed concurrently.
+
+    Lanes live in one process and one event loop: the ordering holds only for
+    messages handled by this process. With several web workers or
+    `python -m src.ingest_worker` processes, cross-process order comes from the
+    ingest queue, which never hands out a sender's message while an earlier
+    one is pending (see IngestStore.claim). The lanes belong to the loop that
+    first used them; on a new loop the old lane workers are cancelled and
+    jobs still queued there fail.
+    """
+
+    def __init__(self, lanes: int = ORDER_LANES):
+        self.lanes = max(lanes, 1)
+        self._queues = None
+        self._busy = [False] * self.lanes
+        self._workers = []
+        self._loop = None
+
+    def lane_for(self, key) -> int:
+        # crc32 rather than hash(): stable across processes and restarts
+        return zlib.crc32(str(key).encode("utf-8")) % self.lanes
+
+    async def run(self, key, job):
+        """
+        Queue `job` (a no-argument callable returning an awaitable) on the
+        lane for `key` and wait for its result. Jobs are queued before this
+        coroutine first suspends, so callers that submit in order keep their
+        order.
+        """
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._queues[self.lane_for(key)].put_nowait((job, future))
+        return await future
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First use (or a new event loop): one worker task per lane
+        self._retire()
+        self._loop = loop
+        self._queues = [asyncio.Queue() for _ in range(self.lanes)]
+        self._busy = [False] * self.lanes
+        self._workers = [loop.create_task(self._work(lane)) for lane in range(self.lanes)]
+
+    def _retire(self):
+        """Cancel the previous loop's lane workers and fail the jobs still queued on them."""
+        loop, queues, workers = self._loop, self._queues, self._workers
+        if loop is None or loop.is_closed():
+            return
+
+        def shutdown():
+            for worker in workers:
+                worker.cancel()
+            for queue in queues:
+                while not queue.empty():
+                    _, future = queue.get_nowait()
+                    if not future.done():
+                        future.set_exception(RuntimeError("lane scheduler moved to another event loop"))
+
+        # The old loop may still be running in another thread
+        loop.call_soon_threadsafe(shutdown)
+
+    async def _work(self, lane: int):
+        queue = self._queues[lane]
+        while True:
+            job, future = await queue.get()
+            self._busy[lane] = True
+            try:
+                result = await job()
+            except asyncio.CancelledError:
+                future.cancel()
+                if asyncio.current_task().cancelling():
+                    raise  # the lane itself is shutting down
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._busy[lane] = False
+                queue.task_done()
+
+    def stats(self) -> dict:
+        depths = [
+            (self._queues[lane].qsize() if self._queues else 0) + int(self._busy[lane])
+            for lane in range(self.lanes)
+        ]
+        return {
+            "lanes": self.lanes,
+            "depths": depths,
+            "pending": sum(depths)
+        }
+
+
+lane_scheduler = LaneScheduler()
+
+
+def get_scheduler_stats() -> dict:
+    return lane_scheduler.stats()
@@ -1,24 +1,95 @@
 from src.ai.matcher import (suggest_product_ai, suggest_product_fuzzy,
-                            phonetic_match)
+                            suggest_products_fuzzy_batch, suggest_products_ai_concurrently,
+                            phonetic_match, AI_MATCH_SKIPPED)
+from src.budget import LatencyBudget
 from src.utils.special_cases import apply_special_cases, SPECIAL_CASES
 
-from src.db import get_products
-from src.parser import get_primary_units
+from src.catalog import catalog
+from src.correction_cache import lookup_correction
+from src.parser import get_primary_unit_index
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+def _needs_product_match(parsed_output: dict, product_names: list[str]) -> bool:
+    product = parsed_output.get("parsed", {}).get("product")
+    if product and product in SPECIAL_CASES.values():
+        return False
+    return not product or product not in product_names
+
+
+def prefetch_fuzzy_candidates(parsed_outputs: list[dict], limit: int = 3):
+    """
+    Fuzzy-score every unresolved line of a message in one batch.
+
+    Stores the ranked (product, score) pairs under extras["fuzzy_candidates"],
+    which validate_order uses instead of scoring the line on its own.
+    """
+    product_names = catalog.names()
+    pending = [p for p in parsed_outputs if _needs_product_match(p, product_names)]
+    if not pending:
+        return
+
+    words = [p.get("extras", {}).get("raw_input", "").strip() for p in pending]
+    candidates = suggest_products_fuzzy_batch(words, product_names, limit=limit)
+    for parsed_output, word_candidates in zip(pending, candidates):
+        parsed_output.setdefault("extras", {})["fuzzy_candidates"] = word_candidates
+
+
+async def prefetch_ai_suggestions(parsed_outputs: list[dict], budget: LatencyBudget = None):
+    """
+    Run the AI matcher for every unresolved line of a message concurrently.
+
+    Lines already covered by a special case or a learned correction are
+    skipped. Results are stored under extras["ai_suggestion"], which
+    validate_order uses instead of making its own blocking call. Lines the
+    latency budget left no time for get extras["ai_skipped"] instead, so
+    they fall through to the local tiers and are flagged for review.
+    """
+    product_names = catalog.names()
+    pending = []
+    for parsed_output in parsed_outputs:
+        if not _needs_product_match(parsed_output, product_names):
+            continue
+        raw_word = parsed_output.get("extras", {}).get("raw_input", "").strip()
+        if apply_special_cases(raw_word) or lookup_correction(raw_word, count=False):
+            continue
+        pending.append((parsed_output, raw_word))
+    if not pending:
+        return
+
+    if budget and not budget.allows_ai():
+        suggestions = [AI_MATCH_SKIPPED] * len(pending)
+    else:
+        timeout = budget.timeout(10.0) if budget else None
+        suggestions = await suggest_products_ai_concurrently([word for _, word in pending], product_names, timeout)
+
+    if budget:
+        budget.skip("product_match", [word for (_, word), s in zip(pending, suggestions) if s is AI_MATCH_SKIPPED])
+    for (parsed_output, _), suggestion in zip(pending, suggestions):
+        extras = parsed_output.setdefault("extras", {})
+        if suggestion is AI_MATCH_SKIPPED:
+            extras["ai_suggestion"] = None
+            extras["ai_skipped"] = True
+        else:
+            extras["ai_suggestion"] = suggestion
+
 
 def validate_order(parsed_output: dict) -> dict:
     parsed = parsed_output.get("parsed", {})
     errors = []
     red_alerts = []
+    needs_review = False
 
     #debug prints
     raw_word = parsed_output.get("extras", {}).get("raw_input", "")
-    print("DEBUG RAW WORD:", repr(raw_word))
+    logger.debug("Raw word: %r", raw_word)
 
-    product_names = [name for name, _ in get_products()]
-    print("DEBUG PRODUCT NAMES:", product_names)
+    product_names = catalog.names()
+    logger.debug("Matching against %d catalog products", len(product_names))
     
     # Debug parsed values
-    print(f"DEBUG PARSED: quantity={parsed.get('quantity')}, unit={parsed.get('unit')}, product={parsed.get('product')}")
+    logger.debug("Parsed: quantity=%s, unit=%s, product=%s", parsed.get("quantity"), parsed.get("unit"), parsed.get("product"))
 
     #quantity
     if parsed.get("quantity") is None:
@@ -29,17 +100,15 @@ def validate_order(parsed_output: dict) -> dict:
         # Try to get primary unit from product
         product = parsed.get("product")
         if product:
-            primary_units = get_primary_units()
             product_lower = product.lower().strip()
-            primary_unit = primary_units.get(product_lower)
-            
-            # If exact match fails, try case-insensitive partial match
-            if not primary_unit:
-                for prod_name, prod_unit in primary_units.items():
-                    if product_lower in prod_name.lower() or prod_name.lower() in product_lower:
-                        primary_unit = prod_unit
-                        print(f"🔍 Matched product '{product}' to '{prod_name}' for primary unit lookup")
-                        break
+            primary_unit = None
+
+            # Exact name first, then the first partial (substring) match
+            match = get_primary_unit_index().lookup(product)
+            if match:
+                prod_name, primary_unit = match
+                if prod_name != product_lower:
+                    logger.debug("🔍 Matched product '%s' to '%s' for primary unit lookup", product, prod_name)
             
             if primary_unit:
                 # Map primary unit to standard unit name
@@ -55,9 +124,9 @@ def validate_order(parsed_output: dict) -> dict:
                 }
                 parsed["unit"] = unit_map.get(primary_unit.lower(), primary_unit.capitalize())
                 errors.append(f"Unit auto-assigned: {parsed['unit']} (primary unit for {product})")
-                print(f"✅ Auto-assigned unit '{parsed['unit']}' for product '{product}'")
+                logger.info("✅ Auto-assigned unit '%s' for product '%s'", parsed['unit'], product)
             else:
-                print(f"⚠️  No primary unit found for product '{product}' (checked: {product_lower})")
+                logger.warning("⚠️  No primary unit found for product '%s' (checked: %s)", product, product_lower)
                 red_alerts.append("Missing unit")
         else:
             red_alerts.append("Missing unit")
@@ -69,22 +138,38 @@ def validate_order(parsed_output: dict) -> dict:
     if parsed.get("product") and parsed["product"] in SPECIAL_CASES.values():
         pass  # do nothing, keep it locked in
 
-    elif not parsed.get("product") or parsed["product"] not in product_names:
+    elif _needs_product_match(parsed_output, product_names):
             suggestion = apply_special_cases(raw_word)
 
             if not suggestion:
-                suggestion = suggest_product_ai(raw_word, product_names)
+                # Misspellings we have resolved before skip the AI round trip
+                suggestion = lookup_correction(raw_word)
+
+            if not suggestion:
+                extras = parsed_output.get("extras", {})
+                if "ai_suggestion" in extras:
+                    suggestion = extras["ai_suggestion"]
+                else:
+                    suggestion = suggest_product_ai(raw_word, product_names)
 
             if not suggestion:
                 suggestion = phonetic_match(raw_word, product_names)
 
             if not suggestion:
-                suggestion = suggest_product_fuzzy(raw_word, product_names)
+                fuzzy_candidates = parsed_output.get("extras", {}).get("fuzzy_candidates")
+                if fuzzy_candidates is not None:
+                    suggestion = fuzzy_candidates[0][0] if fuzzy_candidates else None
+                else:
+                    suggestion = suggest_product_fuzzy(raw_word, product_names)
 
             if suggestion:
                 parsed["product"] = suggestion
                 if suggestion.lower() != raw_word.lower():
                     errors.append(f"Product corrected from '{raw_word}' to '{suggestion}'")
+                if parsed_output.get("extras", {}).get("ai_skipped"):
+                    # Only the local tiers looked at this line
+                    needs_review = True
+                    errors.append(f"Matched '{suggestion}' without AI (latency budget exceeded) - please review")
             else:
                 red_alerts.append(f"Unknown product: {raw_word}")
 
@@ -101,18 +186,21 @@ def validate_order(parsed_output: dict) -> dict:
         action = "continue"
 
     if red_alerts:
-        return {
+        result = {
             "validated": parsed,  # ✅ still include parsed data even with errors
             "errors": errors,  # low-level corrections (if any before fail)
             "red_alerts": red_alerts,  # 🚨 reasons
             "action": "red_alert"
         }
     else:
-        return{
+        result = {
             "validated": parsed,
             "errors": errors,
             "action": action
         }
+    if needs_review:
+        result["needs_review"] = True
+    return result
 
 
 
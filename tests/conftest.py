@@ -0,0 +1,26 @@
+import re
+
+import pytest
+
+from src.catalog import catalog
+from src.logger import PROJECT_ROOT
+
+_PRODUCT_ROW = re.compile(r"\d+ (.+?) (Kg|Box|Pieces|Bag|Bunch|Bucket|Tray) (?:YES|NO)")
+
+
+def _catalog_rows() -> list[tuple[str, list[str]]]:
+    """(name, unit_synonyms) rows like src.db.fetch_products, from the products.txt export."""
+    units = {}
+    for name, unit in _PRODUCT_ROW.findall((PROJECT_ROOT / "products.txt").read_text()):
+        units.setdefault(name, []).append(unit.lower())
+    return list(units.items())
+
+
+@pytest.fixture
+def product_names(monkeypatch) -> list[str]:
+    """Load the shared catalog from products.txt instead of PostgreSQL."""
+    rows = _catalog_rows()
+    monkeypatch.setattr("src.catalog.fetch_products", lambda: rows)
+    monkeypatch.setattr("src.catalog.fetch_products_version", lambda: "products.txt")
+    catalog.reload()
+    return catalog.names()
@@ -0,0 +1,32 @@
+import asyncio
+
+import src.ai.client
+from src.ai.client import AI_CONCURRENCY, ai_semaphore, close_async_client, get_async_client
+
+
+async def _semaphore():
+    semaphore = ai_semaphore()
+    assert ai_semaphore() is semaphore
+    return semaphore
+
+
+def test_each_event_loop_gets_its_own_semaphore():
+    first, second = asyncio.run(_semaphore()), asyncio.run(_semaphore())
+    assert first is not second
+    assert second._value == AI_CONCURRENCY
+
+
+def test_closing_the_loops_client_releases_it(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(src.ai.client, "client", object())
+
+    async def run():
+        async_client = get_async_client()
+        await close_async_client()
+        replacement = get_async_client()
+        await close_async_client()
+        return async_client, replacement
+
+    closed, replacement = asyncio.run(run())
+    assert closed.is_closed()
+    assert replacement is not closed
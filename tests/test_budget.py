@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from src.budget import LatencyBudget
+from src.parser import parser_order
+from src.pipeline import OrderPipeline
+
+
+class _Client:
+    """Stands in for AsyncOpenAI.with_options(); records the options it was given."""
+
+    def __init__(self):
+        self.options = {}
+
+    def with_options(self, **options):
+        self.options = options
+        return self
+
+
+def test_budget_is_spent_and_ai_is_refused_when_low():
+    budget = LatencyBudget(seconds=1.0, min_ai_seconds=0.5)
+    assert budget.allows_ai()
+    assert budget.timeout(10.0) <= 1.0
+    budget.started -= 0.8
+    assert not budget.allows_ai()
+    assert budget.limit({"timeout": 15.0})["timeout"] <= 0.2
+
+
+def test_skips_are_recorded_and_summarised():
+    budget = LatencyBudget()
+    budget.skip("normalization", ["3 bg onoin", "tomatos 2"])
+    budget.skip("product_match", [])
+    assert budget.was_skipped("normalization", "3 bg onoin")
+    assert not budget.was_skipped("product_match", "onoin")
+    assert budget.summary()["skipped"] == {"normalization": 2}
+
+
+def test_call_disables_sdk_retries_and_stops_at_the_deadline():
+    client = _Client()
+
+    async def slow_completion(openai_client, **request):
+        await asyncio.sleep(5)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(LatencyBudget(seconds=0.2).call(client, {"timeout": 15.0}, slow_completion))
+    assert client.options == {"max_retries": 0}
+
+
+def test_lines_kept_as_typed_are_flagged_for_review(product_names):
+    budget = LatencyBudget()
+    budget.skip("normalization", ["5kg onion"])
+    lines = [{"raw_message": "5kg onion", "parsed": parser_order("5kg onion"), "ai_item": None, "remove": False}]
+    OrderPipeline().validate(lines, budget)
+
+    validated = lines[0]["validated"]
+    assert validated["needs_review"] is True
+    assert validated["action"] == "send_to_human"
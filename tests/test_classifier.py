@@ -0,0 +1,60 @@
+import pytest
+
+import src.ai.conversational_agent
+from src.ai.conversational_agent import classify_message_locally, conversational_agent, get_classifier_stats
+
+
+@pytest.mark.parametrize("message", [
+    "5kg onion",
+    "3 bags tomato\n2 box chicken",
+    "2.5 kg carrot please",
+    "chicken 3bg",
+])
+def test_plain_orders_are_decided_locally(product_names, message):
+    assert classify_message_locally(message) == "order"
+
+
+@pytest.mark.parametrize("message", [
+    "the 3 bags of onion were rotten",
+    "2 kg tomato were missing from yesterday",
+    "3 kg onion not delivered",
+    "5kg onion\ncan you also send the invoice?",
+    "5kg onion\nhow much are carrots",
+    "3 bags onion for the new kitchen",
+])
+def test_complaints_questions_and_extra_words_go_to_the_model(product_names, message):
+    assert classify_message_locally(message) is None
+
+
+@pytest.mark.parametrize("message", [
+    "hello, what time is delivery?",
+    "thanks!",
+    "the driver was late again",
+])
+def test_conversation_without_products_is_a_message(product_names, message):
+    assert classify_message_locally(message) == "message"
+
+
+def test_empty_message_is_ambiguous(product_names):
+    assert classify_message_locally("  \n ") is None
+
+
+@pytest.mark.parametrize("message", [
+    "5kg onion es",
+    "5kg onion p",
+    "3 bags tomato k",
+])
+def test_stray_letters_are_not_units(product_names, message):
+    assert classify_message_locally(message) is None
+
+
+def test_llm_is_only_counted_when_the_model_is_called(product_names, monkeypatch):
+    monkeypatch.setattr(src.ai.conversational_agent, "_classifier_stats", {
+        outcome: 0 for outcome in src.ai.conversational_agent._classifier_stats
+    })
+    monkeypatch.setattr(src.ai.conversational_agent, "client", None)
+
+    assert conversational_agent("3 bags onion for the new kitchen", "Cafe")["type"] == "order"
+    stats = get_classifier_stats()
+    assert stats["llm"] == 0
+    assert stats["no_client"] == 1
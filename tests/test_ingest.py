@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+import pytest
+
+import src.ingest
+from src.ingest import _CLAIM_SQL, IngestStore, IngestWorkers, manual_content, message_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IngestStore(str(tmp_path / "ingest.sqlite3"), lease=30, max_attempts=2)
+
+
+def test_message_key_prefers_client_key_then_message_sid():
+    payload = {"MessageSid": "SM123", "RestaurantName": "Cafe", "Body": "5kg onion"}
+    assert message_key({**payload, "IdempotencyKey": "abc"}) == "client-abc"
+    assert message_key(payload) == "SM123"
+    assert message_key({"From": "whatsapp:+1"}) != message_key({"From": "whatsapp:+1"})
+
+
+def test_manual_key_dedupes_within_a_sliding_window(store, monkeypatch):
+    submit = {"RestaurantName": "Cafe ", "Body": "5kg  onion"}
+    content = manual_content(submit)
+    assert content == manual_content({"RestaurantName": "cafe", "Body": "5kg onion"})
+    assert manual_content({**submit, "MessageSid": "SM1"}) is None
+
+    # 119s and 121s straddle a MANUAL_DEDUP_WINDOW boundary but are 2s apart
+    now = 119.0
+    monkeypatch.setattr(src.ingest.time, "time", lambda: now)
+    first = store.manual_key(content, message_key(submit), window=120)
+    now = 121.0
+    assert store.manual_key(content, message_key(submit), window=120) == first
+
+    now = 119.0 + 121
+    assert store.manual_key(content, message_key(submit), window=120) != first
+
+
+def _age(store, message_id, days):
+    store._conn().execute(
+        "UPDATE inbound_messages SET updated_at = ? WHERE message_id = ?", (time.time() - days * 86400, message_id)
+    )
+
+
+def _finish(store, message_id):
+    assert store.claim("test")[0] == message_id
+    store.complete(message_id, "test", {"status": "processed"})
+
+
+def test_prune_drops_only_old_finished_messages(store):
+    for message_id in ("old-done", "new-done", "old-queued"):
+        store.enqueue(message_id, {"Body": message_id})
+    for message_id in ("old-done", "new-done"):
+        _finish(store, message_id)
+    _age(store, "old-done", 8)
+    _age(store, "old-queued", 8)
+
+    assert store.prune(retention_days=7) == 1
+    assert store.status("old-done") is None
+    assert store.status("new-done")["status"] == "done"
+    assert store.status("old-queued")["status"] == "queued"
+
+
+def test_claim_uses_the_claim_index(store):
+    store.enqueue("m1", {})
+    plan = store._conn().execute("EXPLAIN QUERY PLAN " + _CLAIM_SQL, (time.time(), time.time())).fetchall()
+    assert any("inbound_messages_claim" in row[-1] for row in plan)
+
+
+def test_extend_renews_only_the_owners_lease(store):
+    store.enqueue("m1", {})
+    store.claim("worker-a")
+    assert store.extend("m1", "worker-a")
+    assert not store.extend("m1", "worker-b")
+
+
+def test_slow_handler_keeps_its_lease(tmp_path):
+    store = IngestStore(str(tmp_path / "ingest.sqlite3"), lease=0.3)
+    workers = IngestWorkers(store, workers=0)
+    stolen = []
+
+    async def handler(message_id, payload):
+        for _ in range(3):
+            await asyncio.sleep(0.2)
+            stolen.append(await asyncio.to_thread(store.claim, "other-worker"))
+        return {"status": "processed"}
+
+    async def run():
+        workers.handler = handler
+        store.enqueue("m1", {}, owner=workers.owner)
+        return await workers.process("m1", {}, workers.owner)
+
+    assert asyncio.run(run()) == {"status": "processed"}
+    assert stolen == [None, None, None]
+    assert store.status("m1")["status"] == "done"
+
+
+def test_process_passes_the_callers_context_to_the_handler(store):
+    workers = IngestWorkers(store, workers=0)
+
+    async def handler(message_id, payload, budget=None):
+        return {"status": "processed", "budget": budget}
+
+    async def run():
+        workers.handler = handler
+        store.enqueue("m1", {}, owner=workers.owner)
+        return await workers.process("m1", {}, workers.owner, budget="webhook budget")
+
+    assert asyncio.run(run())["budget"] == "webhook budget"
+
+
+def test_same_sender_is_claimed_in_arrival_order_even_after_a_failure(store):
+    store.enqueue("a1", {"From": "whatsapp:+1"})
+    store.enqueue("a2", {"From": "whatsapp:+1"})
+    store.enqueue("b1", {"From": "whatsapp:+2"})
+
+    assert store.claim("w")[0] == "a1"
+    # a2 waits behind a1 while it runs; another sender does not
+    assert store.claim("w")[0] == "b1"
+    assert store.claim("w") is None
+
+    # a1 fails and backs off: a2 still waits for it
+    assert store.fail("a1", "w", "boom") == "queued"
+    assert store.claim("w") is None
+    store._conn().execute("UPDATE inbound_messages SET available_at = 0 WHERE message_id = 'a1'")
+    assert store.claim("w")[0] == "a1"
+    store.complete("a1", "w", {})
+    assert store.claim("w")[0] == "a2"
+
+
+def test_inline_enqueue_queues_behind_a_pending_message(store):
+    assert store.enqueue("a1", {"RestaurantName": "Cafe"}, owner="webhook-1") == "processing"
+    assert store.enqueue("a2", {"RestaurantName": " cafe "}, owner="webhook-2") == "queued"
+    assert store.enqueue("b1", {"RestaurantName": "Bistro"}, owner="webhook-3") == "processing"
+    assert store.enqueue("a1", {"RestaurantName": "Cafe"}, owner="webhook-4") is None
+
+
+def test_failed_messages_back_off_and_are_dead_lettered(store):
+    store.enqueue("m1", {})
+    assert store.claim("w")[0] == "m1"
+    assert store.fail("m1", "w", "first") == "queued"
+    assert store.status("m1")["attempts"] == 1
+
+    store._conn().execute("UPDATE inbound_messages SET available_at = 0 WHERE message_id = 'm1'")
+    assert store.claim("w")[0] == "m1"
+    assert store.fail("m1", "w", "second") == "dead"
+    assert store.claim("w") is None
+    assert store._conn().execute("SELECT error, attempts FROM dead_letters").fetchall() == [("second", 2)]
+
+
+def test_expired_lease_is_claimed_again(store):
+    store.enqueue("m1", {})
+    assert store.claim("w1")[0] == "m1"
+    store._conn().execute("UPDATE inbound_messages SET lease_until = 0 WHERE message_id = 'm1'")
+    assert store.claim("w2")[0] == "m1"
+    # The first worker lost the lease: its outcome is ignored
+    assert store.fail("m1", "w1", "late") == "processing"
+    store.complete("m1", "w1", {"status": "stale"})
+    assert store.status("m1")["status"] == "processing"
+
+
+def test_wait_blocks_until_the_workers_stop(store):
+    workers = IngestWorkers(store, workers=1)
+
+    async def handler(message_id, payload):
+        return {}
+
+    async def run():
+        await workers.start(handler)
+        waiter = asyncio.create_task(workers.wait())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        await workers.stop()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+import csv
+import re
+
+from rapidfuzz import fuzz, process
+
+from src.ai.matcher import ai_candidates, suggest_product_fuzzy
+from src.correction_cache import correction_key
+from src.logger import PROJECT_ROOT
+
+
+def _corrected_words() -> list[str]:
+    words = set()
+    with open(PROJECT_ROOT / "corrections.csv", newline="") as f:
+        for row in csv.DictReader(f):
+            for raw_word, _ in re.findall(r"Product corrected from '(.+?)' to '(.+?)'", row.get("corrections") or ""):
+                words.update((raw_word, correction_key(raw_word)))
+    return sorted(words)
+
+
+def _full_scan(word: str, product_db: list[str], score_cutoff: int = 25) -> str | None:
+    """suggest_product_fuzzy before the trigram shortlist: WRatio over the whole catalog."""
+    db_clean = [p.strip().lower() for p in product_db]
+    match = process.extractOne(word.strip().lower(), db_clean, scorer=fuzz.WRatio, score_cutoff=score_cutoff)
+    return product_db[db_clean.index(match[0])] if match else None
+
+
+def test_fuzzy_shortlist_matches_full_scan_on_corrections(product_names):
+    words = _corrected_words()
+    assert len(words) > 100
+    mismatches = [
+        (word, expected, actual)
+        for word in words
+        if (expected := _full_scan(word, product_names)) != (actual := suggest_product_fuzzy(word, product_names))
+    ]
+    assert mismatches == []
+
+
+def test_fuzzy_exact_name_is_found_in_the_shortlist(product_names):
+    assert suggest_product_fuzzy("chicken", product_names) == "chicken"
+    assert suggest_product_fuzzy("  Chinese Leaves ", product_names) == _full_scan("Chinese Leaves", product_names)
+
+
+def test_ai_candidates_shortlist_close_words(product_names):
+    candidates = ai_candidates("chiken", product_names)
+    assert "chicken" in candidates
+    assert len(candidates) < len(product_names)
+
+
+def test_ai_candidates_fall_back_to_catalog_for_unrelated_words(product_names):
+    # Semantic matches share (almost) no trigrams with the product they mean
+    assert ai_candidates("Donia", product_names) == product_names
+    assert ai_candidates("eggplant", product_names) == product_names
+    assert ai_candidates("", product_names) == product_names
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import src.migrations
+from src.main import health_check
+from src.migrations import migration_status, run_migrations
+
+
+@pytest.fixture(autouse=True)
+def restore_status(monkeypatch):
+    monkeypatch.setattr(src.migrations, "_status", dict(src.migrations._status))
+
+
+def test_failed_migrations_make_the_health_check_fail():
+    # SQLite has no pg_advisory_xact_lock, so the first statement fails
+    with pytest.raises(Exception):
+        run_migrations(create_engine("sqlite://"))
+
+    status = migration_status()
+    assert status["state"] == "error"
+    assert "\n" not in status["error"]
+
+    response = health_check()
+    assert response.status_code == 503
+    assert json.loads(response.body)["status"] == "degraded"
+
+
+def test_health_check_is_ok_once_migrated(monkeypatch):
+    monkeypatch.setattr(src.migrations, "_status", {"state": "ok", "error": None, "applied": [7]})
+    assert health_check() == {"status": "ok", "migrations": "ok"}
+
+
+def test_seeding_fails_against_an_empty_catalog(monkeypatch):
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE product_corrections (raw_word TEXT, product TEXT)"))
+    monkeypatch.setattr(src.migrations.catalog, "names", lambda: [])
+
+    # Raising rolls migration 5 back, so it is retried on the next start
+    with engine.begin() as conn, pytest.raises(RuntimeError):
+        src.migrations._seed_if_empty(conn)
@@ -0,0 +1,48 @@
+import pytest
+
+import src.pipeline
+from src.pipeline import OrderPipeline
+
+
+def _line(raw_message, action="continue", remove=False):
+    validated = {"validated": {"product": raw_message}, "errors": [], "action": action}
+    if action == "red_alert":
+        validated["red_alerts"] = [f"Unknown product: {raw_message}"]
+    return {"raw_message": raw_message, "parsed": {}, "ai_item": None, "remove": remove, "validated": validated}
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    sent = []
+    monkeypatch.setattr(src.pipeline.alert_dispatcher, "notify", lambda restaurant, alerts: sent.append(alerts))
+    return sent
+
+
+def _save_returns(monkeypatch, statuses, duplicate=False):
+    def save_order_batch(validated_outputs, restaurant_id, restaurant_name, message_id=None):
+        results = [{"status": status} for status in statuses]
+        return {"results": results, "saved_count": statuses.count("saved"), "duplicate": duplicate}
+    monkeypatch.setattr(src.pipeline, "save_order_batch", save_order_batch)
+
+
+def test_alerts_cover_saved_red_alert_lines_and_removes(monkeypatch, notified):
+    _save_returns(monkeypatch, ["saved", "saved"])
+    lines = [_line("5kg onoin", "red_alert"), _line("2kg tomato"), _line("remove rice", remove=True)]
+    OrderPipeline().save(lines, "body", 1, "Cafe", "m1")
+
+    assert notified == [[
+        ("5kg onoin", ["Unknown product: 5kg onoin"]),
+        ("body", ["REMOVE request detected — manual handling required"])
+    ]]
+
+
+def test_no_red_alert_for_lines_that_were_not_saved(monkeypatch, notified):
+    _save_returns(monkeypatch, ["error"])
+    OrderPipeline().save([_line("5kg onoin", "red_alert")], "body", None, "Unknown", "m1")
+    assert notified == [[]]
+
+
+def test_no_alerts_for_a_message_saved_before(monkeypatch, notified):
+    _save_returns(monkeypatch, ["duplicate"], duplicate=True)
+    OrderPipeline().save([_line("5kg onoin", "red_alert"), _line("remove rice", remove=True)], "body", 1, "Cafe", "m1")
+    assert notified == []
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from sqlalchemy import exc, insert
+from sqlalchemy.dialects.postgresql import psycopg2
+
+from import_orders import read_orders
+from src.logger import PROJECT_ROOT
+from src.saver import _classify_order_error, _copy_csv, _csv_field, _restaurant_orders
+
+_FK_VIOLATION = Exception('insert or update violates foreign key constraint "restaurant_orders_restaurant_id_fkey"')
+
+
+def test_foreign_key_failure_on_restaurant_orders_is_classified():
+    error = exc.IntegrityError("INSERT INTO public.restaurant_orders (restaurant_id) VALUES (%(id)s)", {}, _FK_VIOLATION)
+    assert _classify_order_error(error, 7)["error"] == "restaurant_not_found"
+
+
+def test_returned_order_ids_are_sorted_into_row_order_on_postgres():
+    statement = insert(_restaurant_orders).returning(_restaurant_orders.c.id, sort_by_parameter_order=True)
+    compiled = statement.compile(dialect=psycopg2.dialect(), column_keys=["product", "quantity"], for_executemany=True)
+    assert "ORDER BY sen_counter" in compiled.string
+    assert compiled._insertmanyvalues.sentinel_columns == (_restaurant_orders.c.id,)
+
+
+def test_failures_of_other_statements_are_not_classified():
+    error = exc.IntegrityError("INSERT INTO checked_orders (restaurant_name) VALUES (%(name)s)", {}, _FK_VIOLATION)
+    assert _classify_order_error(error, 7) is None
+    assert _classify_order_error(ValueError("relation does not exist"), 7) is None
+
+
+def test_copy_csv_keeps_null_empty_and_backslash_n_apart():
+    rows = [
+        {"product": None, "corrections": "", "message": "\\N", "need_attention": True},
+        {"product": 'Onion "red"', "corrections": "a,b", "message": "two\nlines", "need_attention": False},
+    ]
+    rendered = _copy_csv(["product", "corrections", "message", "need_attention"], rows).getvalue()
+    assert rendered == (
+        '\\N,"","\\N","true"\n'
+        '"Onion ""red""","a,b","two\nlines","false"\n'
+    )
+
+
+def test_copy_csv_writes_timestamps_postgres_can_parse():
+    assert _csv_field(datetime(2025, 11, 3, 9, 30)) == '"2025-11-03 09:30:00"'
+
+
+def test_orders_export_rows_are_ready_for_copy():
+    rows, skipped = read_orders(str(PROJECT_ROOT / "orders.csv"))
+    assert skipped > 0
+    assert rows[0]["restaurant_name"] == "Spice Merchant"
+    assert rows[0]["date"] == datetime(2025, 11, 3)
+    # Customer messages without a restaurant id keep a NULL id and are flagged
+    message = next(row for row in rows if row["message"] == "Please help")
+    assert message["restaurant_id"] is None and message["need_attention"] is True
+    assert len({tuple(row) for row in rows}) == 1
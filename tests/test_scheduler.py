@@ -0,0 +1,103 @@
+import asyncio
+import concurrent.futures
+import threading
+
+import pytest
+
+from src.scheduler import LaneScheduler
+
+
+def test_jobs_for_one_key_run_in_submission_order():
+    scheduler = LaneScheduler(lanes=4)
+    finished = []
+
+    def job(name, delay):
+        async def run():
+            await asyncio.sleep(delay)
+            finished.append(name)
+            return name
+        return run
+
+    async def main():
+        # The first job is the slowest; FIFO means it still finishes first
+        return await asyncio.gather(*(
+            scheduler.run("cafe", job(f"cafe-{i}", 0.03 - i * 0.01)) for i in range(3)
+        ))
+
+    assert asyncio.run(main()) == ["cafe-0", "cafe-1", "cafe-2"]
+    assert finished == ["cafe-0", "cafe-1", "cafe-2"]
+
+
+def test_different_lanes_run_concurrently():
+    scheduler = LaneScheduler(lanes=8)
+    keys = [key for key in ("a", "b", "c", "d", "e", "f") if scheduler.lane_for(key) != scheduler.lane_for("a")]
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def blocker():
+            await gate.wait()
+            return "a"
+
+        async def opener():
+            gate.set()
+            return keys[0]
+
+        return await asyncio.wait_for(asyncio.gather(scheduler.run("a", blocker), scheduler.run(keys[0], opener)), 1)
+
+    assert asyncio.run(main()) == ["a", keys[0]]
+
+
+def test_failures_reach_the_caller_and_the_lane_keeps_going():
+    scheduler = LaneScheduler(lanes=1)
+
+    async def boom():
+        raise ValueError("boom")
+
+    async def ok():
+        return "ok"
+
+    async def main():
+        with pytest.raises(ValueError):
+            await scheduler.run("cafe", boom)
+        return await scheduler.run("cafe", ok)
+
+    assert asyncio.run(main()) == "ok"
+
+
+def test_scheduler_restarts_on_a_new_event_loop():
+    scheduler = LaneScheduler(lanes=2)
+
+    async def ok():
+        return asyncio.get_running_loop()
+
+    first = asyncio.run(scheduler.run("cafe", ok))
+    second = asyncio.run(scheduler.run("cafe", ok))
+    assert first is not second
+
+
+def test_moving_to_a_new_loop_stops_the_old_lanes():
+    scheduler = LaneScheduler(lanes=1)
+    old_loop = asyncio.new_event_loop()
+    threading.Thread(target=old_loop.run_forever, daemon=True).start()
+    release = threading.Event()
+
+    async def blocking():
+        await asyncio.to_thread(release.wait, 2)
+
+    async def ok():
+        return "ok"
+
+    running = asyncio.run_coroutine_threadsafe(scheduler.run("cafe", blocking), old_loop)
+    queued = asyncio.run_coroutine_threadsafe(scheduler.run("cafe", ok), old_loop)
+    while scheduler.stats()["pending"] < 2:
+        threading.Event().wait(0.01)
+
+    assert asyncio.run(scheduler.run("cafe", ok)) == "ok"
+    with pytest.raises(concurrent.futures.CancelledError):
+        running.result(timeout=1)
+    with pytest.raises(RuntimeError, match="another event loop"):
+        queued.result(timeout=1)
+
+    release.set()
+    old_loop.call_soon_threadsafe(old_loop.stop)